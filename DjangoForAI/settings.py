@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,8 +43,11 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
+    "chat.profiling.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
+    "chat.ratelimit.RateLimitMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
@@ -80,6 +84,32 @@ DATABASES = {
     }
 }
 
+# Production profile: set POSTGRES_DB (and POSTGRES_USER, POSTGRES_PASSWORD,
+# POSTGRES_HOST, POSTGRES_PORT) to use PostgreSQL. Connections come from a
+# psycopg pool shared by each process's threads; set POSTGRES_POOL=0 to use
+# persistent per-thread connections instead (e.g. behind PgBouncer), kept for
+# POSTGRES_CONN_MAX_AGE seconds.
+if os.environ.get("POSTGRES_DB"):
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ["POSTGRES_DB"],
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+    }
+    if os.environ.get("POSTGRES_POOL", "1") != "0":
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("POSTGRES_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ.get("POSTGRES_POOL_MAX_SIZE", 10)),
+                "timeout": 10,
+            },
+        }
+    else:
+        DATABASES["default"]["CONN_MAX_AGE"] = int(os.environ.get("POSTGRES_CONN_MAX_AGE", 600))
+        DATABASES["default"]["CONN_HEALTH_CHECKS"] = True
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -119,6 +149,18 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+STATIC_ROOT = BASE_DIR / "staticfiles"
+
+# collectstatic writes content-hashed copies plus .gz (and .br, with the
+# brotli package) variants; WhiteNoise serves the hashed files as immutable
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -1,35 +1,140 @@
 from django.contrib import admin
-from django.db.models import Count  # Import Count from models, not admin
-from .models import Conversation, Message
+from django.contrib.admin.views.main import ERROR_FLAG, PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import Count, IntegerField, OuterRef, Subquery  # Import Count from models, not admin
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+from .models import Conversation, ConversationArchive, Message
+from .pipeline import get_pipeline
+
+# Unfiltered changelists over tables larger than this use the planner's row estimate
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids COUNT(*) over large unfiltered tables
+
+    On PostgreSQL an unfiltered queryset is counted from the planner's
+    statistics in pg_class; anything else falls back to an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        query = self.object_list.query
+        if connection.vendor == "postgresql" and not query.where:
+            with connection.cursor() as cursor:
+                # Autovacuum only keeps statistics on the partitions of a partitioned table
+                table = self.object_list.model._meta.db_table
+                cursor.execute(
+                    "SELECT SUM(GREATEST(reltuples, 0))::bigint FROM pg_class "
+                    "WHERE (oid = %s::regclass AND relkind <> 'p') "
+                    "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                    [table, table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class ConversationIdFilter(admin.SimpleListFilter):
+    """Filter messages by typing a conversation ID instead of picking from a list"""
+
+    title = "conversation ID"
+    parameter_name = "conversation_id"
+    template = "admin/chat/id_filter.html"
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if not value:
+            return queryset
+        if not value.isdigit():
+            return queryset.none()
+        return queryset.filter(conversation_id=value)
+
+    def choices(self, changelist):
+        ignored = {self.parameter_name, PAGE_VAR, ERROR_FLAG}
+        yield {
+            "value": self.value() or "",
+            "parameter_name": self.parameter_name,
+            "hidden_params": [
+                (name, value) for name, value in changelist.params.items() if name not in ignored
+            ],
+            "clear_query_string": changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+class HighVolumeAdminMixin:
+    """Changelist settings for tables too large to count or list in full"""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
 
 
 @admin.register(Conversation)
-class ConversationAdmin(admin.ModelAdmin):
-    list_display = ("title", "get_message_count", "created_at", "updated_at")
+class ConversationAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
+    list_display = ("title", "model", "get_message_count", "created_at", "updated_at")
     list_filter = ("created_at", "updated_at")
     search_fields = ("title",)
     readonly_fields = ("created_at", "updated_at")
     ordering = ("-updated_at",)
+    date_hierarchy = "updated_at"
 
     def get_message_count(self, obj):
-        return obj.messages.count()
+        return obj.num_messages
 
     get_message_count.short_description = "Messages"
-    get_message_count.admin_order_field = "messages__count"
+    get_message_count.admin_order_field = "num_messages"
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        queryset = queryset.annotate(messages__count=Count("messages"))
+        # A correlated subquery only counts messages for the rows on the page,
+        # unlike a join + GROUP BY over the whole message table
+        message_counts = (
+            Message.objects.filter(conversation=OuterRef("pk"))
+            .order_by()
+            .values("conversation")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        queryset = queryset.annotate(
+            num_messages=Coalesce(Subquery(message_counts, output_field=IntegerField()), 0)
+        )
         return queryset
 
 
 @admin.register(Message)
-class MessageAdmin(admin.ModelAdmin):
+class MessageAdmin(HighVolumeAdminMixin, admin.ModelAdmin):
     list_display = ("conversation_title", "sender", "content_preview", "timestamp")
-    list_filter = ("is_user", "timestamp", "conversation")
-    search_fields = ("content", "conversation__title")
+    list_filter = ("is_user", ConversationIdFilter)
+    list_select_related = ("conversation",)
+    # Long message bodies are stored compressed, where a content search
+    # cannot match them, so only titles are searched
+    search_fields = ("conversation__title",)
     readonly_fields = ("timestamp",)
     ordering = ("-timestamp",)
+    date_hierarchy = "timestamp"
+    autocomplete_fields = ("conversation",)
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.only(
+            "id", "content", "is_user", "timestamp", "conversation__id", "conversation__title"
+        )
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if "content" in form.changed_data:
+            # Re-render and re-embed the edited content
+            get_pipeline().schedule(obj)
 
     def conversation_title(self, obj):
         return obj.conversation.title
@@ -53,3 +158,15 @@ class MessageAdmin(admin.ModelAdmin):
         (None, {"fields": ("conversation", "is_user", "content")}),
         ("Timestamps", {"fields": ("timestamp",), "classes": ("collapse",)}),
     )
+
+
+@admin.register(ConversationArchive)
+class ConversationArchiveAdmin(admin.ModelAdmin):
+    list_display = ("title", "original_id", "message_count", "codec", "updated_at", "archived_at")
+    search_fields = ("title",)
+    exclude = ("payload",)
+    readonly_fields = ("original_id", "title", "message_count", "codec", "created_at", "updated_at", "archived_at")
+    ordering = ("-archived_at",)
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,267 @@
+"""Pluggable model backends for chat, streaming and embeddings
+
+Backends are configured like Django's CACHES, with the CHAT_BACKENDS
+setting mapping an alias to a backend class and its parameters::
+
+    CHAT_BACKENDS = {
+        "ollama": {
+            "BACKEND": "chat.backends.OllamaBackend",
+            "BASE_URL": "http://localhost:11434",
+            "MODEL": "gemma3:4b",
+        },
+        "openai": {
+            "BACKEND": "chat.backends.OpenAICompatibleBackend",
+            "BASE_URL": "http://localhost:8080/v1",
+            "MODEL": "llama-3.2-1b",
+            "API_KEY": "...",
+        },
+    }
+"""
+
+import json
+import threading
+
+import httpx
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .constants import (
+    DEFAULT_BACKEND,
+    DEFAULT_BACKENDS,
+    OLLAMA_TIMEOUT,
+    OLLAMA_STREAM_TIMEOUT,
+    ERROR_MESSAGES,
+)
+from .exceptions import (
+    BackendConnectionError,
+    BackendResponseError,
+    OllamaConnectionError,
+    OllamaResponseError,
+)
+
+
+class ChatBackend:
+    """Base class for model servers
+
+    ``options`` holds the generation options in GENERATION_OPTIONS (num_ctx,
+    num_predict, temperature); backends translate the ones they support.
+    ``chat`` and ``stream`` fill ``usage`` with ``eval_count`` (the number of
+    generated tokens) when the server reports it.
+    """
+
+    connection_error = BackendConnectionError
+    response_error = BackendResponseError
+
+    def __init__(self, base_url, model, timeout=OLLAMA_TIMEOUT, stream_timeout=OLLAMA_STREAM_TIMEOUT, **kwargs):
+        if kwargs:
+            raise ImproperlyConfigured(
+                f"Unknown {type(self).__name__} parameters: {', '.join(key.upper() for key in kwargs)}"
+            )
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+
+    async def chat(self, messages, model=None, options=None, usage=None):
+        """Get a complete response"""
+        raise NotImplementedError
+
+    def stream(self, messages, model=None, options=None, usage=None):
+        """Yield response tokens as they are generated"""
+        raise NotImplementedError
+
+    def embeddings(self, text, model=None):
+        """Get the embedding vector for a text"""
+        raise NotImplementedError
+
+    def warm(self, messages, model=None, options=None, keep_alive=None):
+        """Load a prompt into the server's cache without generating
+
+        Returns whether the backend supports it; the default does nothing.
+        """
+        return False
+
+    def headers(self):
+        """Extra HTTP headers sent with every request"""
+        return {}
+
+    def translate_errors(self, error):
+        """Convert an httpx error into the backend's exception type"""
+        if isinstance(error, httpx.ConnectError):
+            return self.connection_error(f"{ERROR_MESSAGES['OLLAMA_CONNECTION']}: {str(error)}")
+        if isinstance(error, httpx.TimeoutException):
+            return self.connection_error(f"Request to {self.base_url} timed out")
+        return self.response_error(f"Unexpected error: {str(error)}")
+
+    def post(self, path, payload):
+        """POST a JSON payload synchronously and return the decoded response"""
+        try:
+            with httpx.Client(timeout=self.timeout, headers=self.headers()) as client:
+                response = client.post(f"{self.base_url}{path}", json=payload)
+        except httpx.HTTPError as e:
+            raise self.translate_errors(e)
+        if response.status_code != 200:
+            raise self.response_error(ERROR_MESSAGES["OLLAMA_ERROR"])
+        return response.json()
+
+    async def apost(self, path, payload):
+        """POST a JSON payload asynchronously and return the decoded response"""
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout, headers=self.headers()) as client:
+                response = await client.post(f"{self.base_url}{path}", json=payload)
+        except httpx.HTTPError as e:
+            raise self.translate_errors(e)
+        if response.status_code != 200:
+            raise self.response_error(ERROR_MESSAGES["OLLAMA_ERROR"])
+        return response.json()
+
+
+class OllamaBackend(ChatBackend):
+    """Backend for Ollama's native API"""
+
+    connection_error = OllamaConnectionError
+    response_error = OllamaResponseError
+
+    def __init__(self, base_url, model, keep_alive=None, **kwargs):
+        super().__init__(base_url, model, **kwargs)
+        self.keep_alive = keep_alive
+
+    def payload(self, messages, model, options, stream):
+        payload = {
+            "model": model or self.model,
+            "messages": messages,
+            "stream": stream,
+        }
+        if options:
+            payload["options"] = options
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    async def chat(self, messages, model=None, options=None, usage=None):
+        data = await self.apost("/api/chat", self.payload(messages, model, options, stream=False))
+        if usage is not None:
+            usage["eval_count"] = data.get("eval_count", 0)
+        return data.get("message", {}).get("content", "")
+
+    def stream(self, messages, model=None, options=None, usage=None):
+        try:
+            with httpx.Client(timeout=self.stream_timeout) as client:
+                with client.stream(
+                    "POST",
+                    f"{self.base_url}/api/chat",
+                    json=self.payload(messages, model, options, stream=True),
+                ) as response:
+                    if response.status_code != 200:
+                        raise self.response_error(ERROR_MESSAGES["OLLAMA_ERROR"])
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        try:
+                            data = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        token = (data.get("message") or {}).get("content")
+                        if token:
+                            yield token
+                        if data.get("done") and usage is not None:
+                            usage["eval_count"] = data.get("eval_count", 0)
+        except httpx.HTTPError as e:
+            raise self.translate_errors(e)
+
+    def embeddings(self, text, model=None):
+        data = self.post("/api/embeddings", {"model": model or self.model, "prompt": text})
+        return data["embedding"]
+
+    def warm(self, messages, model=None, options=None, keep_alive=None):
+        payload = self.payload(messages, model, {**(options or {}), "num_predict": 0}, stream=False)
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        self.post("/api/chat", payload)
+        return True
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """Backend for servers implementing the OpenAI chat completions API
+
+    ``base_url`` includes the version prefix, e.g. ``http://localhost:8080/v1``.
+    """
+
+    def __init__(self, base_url, model, api_key=None, **kwargs):
+        super().__init__(base_url, model, **kwargs)
+        self.api_key = api_key
+
+    def payload(self, messages, model, options, stream):
+        payload = {"model": model or self.model, "messages": messages, "stream": stream}
+        options = options or {}
+        if "num_predict" in options:
+            payload["max_tokens"] = options["num_predict"]
+        if "temperature" in options:
+            payload["temperature"] = options["temperature"]
+        if stream:
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+
+    async def chat(self, messages, model=None, options=None, usage=None):
+        data = await self.apost("/chat/completions", self.payload(messages, model, options, stream=False))
+        if data.get("usage") and usage is not None:
+            usage["eval_count"] = data["usage"].get("completion_tokens", 0)
+        return data["choices"][0]["message"]["content"] or ""
+
+    def stream(self, messages, model=None, options=None, usage=None):
+        try:
+            with httpx.Client(timeout=self.stream_timeout, headers=self.headers()) as client:
+                with client.stream(
+                    "POST",
+                    f"{self.base_url}/chat/completions",
+                    json=self.payload(messages, model, options, stream=True),
+                ) as response:
+                    if response.status_code != 200:
+                        raise self.response_error(ERROR_MESSAGES["OLLAMA_ERROR"])
+                    for line in response.iter_lines():
+                        if not line.startswith("data: ") or line == "data: [DONE]":
+                            continue
+                        try:
+                            data = json.loads(line[len("data: "):])
+                        except json.JSONDecodeError:
+                            continue
+                        for choice in data.get("choices") or []:
+                            token = (choice.get("delta") or {}).get("content")
+                            if token:
+                                yield token
+                        if data.get("usage") and usage is not None:
+                            usage["eval_count"] = data["usage"].get("completion_tokens", 0)
+        except httpx.HTTPError as e:
+            raise self.translate_errors(e)
+
+    def embeddings(self, text, model=None):
+        data = self.post("/embeddings", {"model": model or self.model, "input": text})
+        return data["data"][0]["embedding"]
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def backend_configs():
+    """Get the backend configurations by alias, from settings.CHAT_BACKENDS"""
+    return getattr(settings, "CHAT_BACKENDS", DEFAULT_BACKENDS)
+
+
+def get_backend(alias=None):
+    """Get the backend configured under an alias in settings.CHAT_BACKENDS"""
+    alias = alias or DEFAULT_BACKEND
+    with _backends_lock:
+        if alias not in _backends:
+            config = backend_configs()
+            if alias not in config:
+                raise ImproperlyConfigured(f"No chat backend named '{alias}' in CHAT_BACKENDS")
+            params = {key.lower(): value for key, value in config[alias].items()}
+            backend_class = import_string(params.pop("backend"))
+            _backends[alias] = backend_class(**params)
+        return _backends[alias]
+
@@ -0,0 +1,208 @@
+"""Bulk prompt processing on top of OllamaService.get_completion"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from asgiref.sync import sync_to_async
+
+from .backends import get_backend
+from .models import Conversation
+from .services import OllamaService
+from .ratelimit import debit_tokens, tokens_exhausted
+from .exceptions import ChatException
+from .constants import (
+    BATCH_CONCURRENCY,
+    BATCH_MAX_RETRIES,
+    BATCH_RETRY_BACKOFF,
+    BATCH_PERSIST_SIZE,
+    ERROR_MESSAGES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def parse_prompt(item, index):
+    """Normalize a prompt given as a string or a {"id", "prompt"} object"""
+    if isinstance(item, str):
+        return {"id": index, "prompt": item}
+    if isinstance(item, dict) and isinstance(item.get("prompt"), str):
+        return {"id": item.get("id", index), "prompt": item["prompt"]}
+    raise ValueError(f"Invalid prompt at position {index}")
+
+
+@dataclass
+class BatchReport:
+    """Throughput statistics for a finished batch"""
+
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    persisted: int = 0
+    elapsed: float = 0.0
+    latencies: list = field(default_factory=list, repr=False)
+
+    def as_dict(self):
+        latencies = sorted(self.latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+        return {
+            "total": self.total,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "persisted": self.persisted,
+            "elapsed": round(self.elapsed, 3),
+            "prompts_per_second": round(self.total / self.elapsed, 2) if self.elapsed else 0.0,
+            "avg_latency": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p95_latency": round(p95, 3),
+        }
+
+
+class BatchRunner:
+    """Run prompts through Ollama with bounded concurrency and retries
+
+    Each prompt becomes its own single-turn request. Results are handed to the
+    ``on_result`` callback as they complete, so output can be streamed instead
+    of held in memory; successful exchanges are optionally persisted as
+    conversations in bulk.
+    """
+
+    def __init__(
+        self,
+        concurrency=BATCH_CONCURRENCY,
+        retries=BATCH_MAX_RETRIES,
+        backoff=BATCH_RETRY_BACKOFF,
+        persist=False,
+        persist_batch_size=BATCH_PERSIST_SIZE,
+        backend=None,
+        model=None,
+        client_identities=(),
+    ):
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.persist = persist
+        self.persist_batch_size = persist_batch_size
+        self.backend = backend
+        self.model = model
+        self.client_identities = client_identities
+
+    async def run(self, prompts, on_result=None):
+        """Process an iterable of normalized prompts and return a BatchReport
+
+        Raises ImproperlyConfigured before doing any work if the backend alias
+        is unknown.
+        """
+        get_backend(self.backend)
+        report = BatchReport()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        pending_exchanges = []
+        started = time.perf_counter()
+
+        async def flush():
+            exchanges = pending_exchanges[:]
+            pending_exchanges.clear()
+            if exchanges:
+                await sync_to_async(Conversation.objects.bulk_create_exchanges)(
+                    exchanges, backend=self.backend, model=self.model
+                )
+                report.persisted += len(exchanges)
+
+        async def worker():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                result = await self.complete(item, report)
+                if on_result:
+                    on_result(result)
+                if self.persist and result["error"] is None:
+                    pending_exchanges.append((result["prompt"], result["response"]))
+                    if len(pending_exchanges) >= self.persist_batch_size:
+                        await flush()
+
+        async def produce():
+            for item in prompts:
+                report.total += 1
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        # Waiting on the producer with the workers: if a worker fails, the
+        # producer may be blocked on the full queue, so it's cancelled instead
+        tasks = [asyncio.create_task(produce()), *workers]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+        await flush()
+
+        report.elapsed = time.perf_counter() - started
+        return report
+
+    async def complete(self, item, report):
+        """Get a completion for one prompt, retrying failed attempts
+
+        With client identities, each response is charged to their token
+        quota, and prompts are refused once it is overdrawn.
+        """
+        if self.client_identities and await sync_to_async(tokens_exhausted)(self.client_identities):
+            report.failed += 1
+            return {
+                "id": item["id"],
+                "prompt": item["prompt"],
+                "response": None,
+                "error": ERROR_MESSAGES["RATE_LIMITED"],
+                "attempts": 0,
+                "latency": 0.0,
+            }
+
+        messages = [{"role": "user", "content": item["prompt"]}]
+        started = time.perf_counter()
+        error = None
+        for attempt in range(1, self.retries + 2):
+            usage = {}
+            try:
+                response = await OllamaService.get_completion(
+                    messages, backend=self.backend, model=self.model, usage=usage
+                )
+                break
+            except ChatException as e:
+                error = str(e)
+                if attempt > self.retries:
+                    response = None
+                    break
+                report.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            except Exception as e:
+                # Not a server or connection failure, so retrying won't help
+                logger.exception("Batch prompt %s failed", item["id"])
+                error = f"{type(e).__name__}: {e}"
+                response = None
+                break
+
+        latency = time.perf_counter() - started
+        if response is None:
+            report.failed += 1
+        else:
+            error = None
+            report.succeeded += 1
+            report.latencies.append(latency)
+            if self.client_identities:
+                await sync_to_async(debit_tokens)(
+                    self.client_identities, usage.get("eval_count") or len(response.split())
+                )
+        return {
+            "id": item["id"],
+            "prompt": item["prompt"],
+            "response": response,
+            "error": error,
+            "attempts": attempt,
+            "latency": round(latency, 3),
+        }
@@ -7,10 +7,96 @@ OLLAMA_MODEL = "gemma3:4b"
 OLLAMA_TIMEOUT = 60.0  # seconds
 OLLAMA_STREAM_TIMEOUT = 60.0
 
+# Model Backends (override with settings.CHAT_BACKENDS, see chat/backends.py)
+DEFAULT_BACKEND = "ollama"
+DEFAULT_BACKENDS = {
+    DEFAULT_BACKEND: {
+        "BACKEND": "chat.backends.OllamaBackend",
+        "BASE_URL": OLLAMA_BASE_URL,
+        "MODEL": OLLAMA_MODEL,
+    },
+}
+GENERATION_OPTIONS = ("num_ctx", "num_predict", "temperature")  # per-conversation options
+
+# Token Bus Configuration (override with settings.CHAT_TOKEN_BUS)
+TOKEN_BUS_BACKEND = "chat.pubsub.InProcessTokenBus"
+TOKEN_CHANNEL_TTL = 300  # seconds a finished channel is kept for late subscribers
+TOKEN_SUBSCRIBE_TIMEOUT = OLLAMA_STREAM_TIMEOUT
+TOKEN_POLL_INTERVAL = 0.1  # seconds between polls for the database bus
+GENERATION_CLAIM_TIMEOUT = 300  # seconds a message's generation stays claimed
+CANCEL_CHECK_INTERVAL = 0.25  # seconds between checks for a cancelled generation
+
 # Message Configuration
 MAX_MESSAGE_LENGTH = 10000
 CONVERSATION_CONTEXT_LIMIT = 10  # Number of previous messages to include
 TITLE_TRUNCATE_LENGTH = 50
+COMPRESSION_THRESHOLD = 512  # characters; longer message bodies are stored compressed
+
+# Retrieval Configuration (enable with settings.CHAT_RETRIEVAL_ENABLED)
+EMBEDDING_MODEL = "nomic-embed-text"  # override with settings.CHAT_EMBEDDING_MODEL
+RETRIEVAL_TOP_K = 4  # earlier messages retrieved into the context alongside recent ones
+EMBEDDING_WAIT_TIMEOUT = 10  # seconds to wait for a message another thread is embedding
+
+# Post-turn Pipeline Configuration (see chat/pipeline.py)
+PIPELINE_STAGES = ("tokens", "render", "title", "embed")  # override with settings.CHAT_PIPELINE_STAGES
+PIPELINE_CONCURRENCY = 2  # messages processed at once per worker process
+PIPELINE_MAX_RETRIES = 2
+PIPELINE_RETRY_BACKOFF = 0.5  # seconds, doubled after each failed attempt
+TITLE_PROMPT = (
+    "Write a short title (at most six words) for a conversation that starts with "
+    "the message below. Reply with the title only, without quotes.\n\n{message}"
+)
+TITLE_MAX_TOKENS = 20
+TITLE_SOURCE_LENGTH = 2000  # characters of the first message shown to the model
+
+# Prompt Prefetch Configuration
+PREFETCH_KEEP_ALIVE = "10m"  # how long Ollama keeps the model (and its KV cache) loaded
+PREFETCH_WARM_TTL = 600  # seconds a prefetched context is considered warm; matches keep_alive
+PREFETCH_MIN_INTERVAL = 5  # seconds between prefetches for one conversation
+
+# Batch Configuration
+BATCH_CONCURRENCY = 4  # concurrent requests to Ollama
+BATCH_MAX_RETRIES = 2
+BATCH_RETRY_BACKOFF = 1.0  # seconds, doubled after each failed attempt
+BATCH_PERSIST_SIZE = 100  # conversations per bulk insert
+BATCH_MAX_PROMPTS = 500  # prompts accepted per request to the batch endpoint
+
+# Retention Configuration
+RETENTION_MAX_AGE_DAYS = 180  # archive conversations idle for longer than this
+RETENTION_BATCH_SIZE = 100  # conversations archived per transaction
+ARCHIVE_CODECS = ("zstd", "gzip")  # preferred first; zstd needs the zstandard package
+
+# Rate Limiting Configuration (override with settings.CHAT_RATE_LIMITS, see chat/ratelimit.py)
+RATE_LIMITS = {
+    "requests": (20, 20 / 60),  # burst of 20 requests, then 20 per minute
+    "tokens": (20000, 100000 / 3600),  # generated tokens: burst of 20k, then 100k per hour
+}
+RATE_LIMITED_VIEWS = {  # URL name -> limited methods
+    "homepage": ("POST",),
+    "chat": ("POST",),
+    "stream_chat": ("GET",),
+    "batch_complete": ("POST",),
+    "prefetch": ("POST",),  # evaluates the history in the model, throttled per conversation only
+}
+
+# Partitioning Configuration (PostgreSQL only, see chat/partitioning.py)
+PARTITION_MONTHS_AHEAD = 3  # monthly message partitions created ahead of time
+
+# Profiling Configuration (enable with settings.CHAT_PROFILING, see chat/profiling.py)
+PROFILING_SLOW_MS = 1000  # requests slower than this are logged with their trace
+PROFILE_DUMP_DIR = "profiles"  # under BASE_DIR; override with settings.CHAT_PROFILE_DIR
+
+# Vendored Static Assets (downloaded by the vendor_static command)
+VENDOR_ASSETS = {  # static path -> pinned CDN URL, used until the file is vendored
+    "vendor/bootstrap/bootstrap.min.css": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css",
+    "vendor/bootstrap/bootstrap.bundle.min.js": "https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js",
+    "vendor/bootstrap-icons/bootstrap-icons.css": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/bootstrap-icons.css",
+    "vendor/bootstrap-icons/fonts/bootstrap-icons.woff2": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff2",
+    "vendor/bootstrap-icons/fonts/bootstrap-icons.woff": "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.10.0/font/fonts/bootstrap-icons.woff",
+    "vendor/highlight/github.min.css": "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.8.0/styles/github.min.css",
+    "vendor/highlight/highlight.min.js": "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.8.0/highlight.min.js",
+    "vendor/htmx/htmx.min.js": "https://unpkg.com/htmx.org@1.9.10/dist/htmx.min.js",
+}
 
 # UI Configuration
 RECENT_CONVERSATIONS_LIMIT = 5
@@ -24,6 +110,11 @@ ERROR_MESSAGES = {
     "OLLAMA_ERROR": "Sorry, I'm having trouble connecting to Gemma 3 4B.",
     "NO_RESPONSE": "No response received from the model",
     "INVALID_JSON": "Invalid JSON in request",
+    "INVALID_BATCH": "Expected a non-empty list of prompts",
+    "BATCH_TOO_LARGE": f"Too many prompts (max {BATCH_MAX_PROMPTS} per request)",
+    "GENERATION_STOPPED": "Generation stopped before any response was received",
+    "STREAM_TIMEOUT": "Timed out waiting for the model response",
+    "RATE_LIMITED": "Too many requests, please slow down",
 }
 
 # Model Display Names
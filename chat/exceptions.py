@@ -6,12 +6,22 @@ class ChatException(Exception):
     pass
 
 
-class OllamaConnectionError(ChatException):
+class BackendConnectionError(ChatException):
+    """Raised when unable to connect to a model backend"""
+    pass
+
+
+class BackendResponseError(ChatException):
+    """Raised when a model backend returns an invalid response"""
+    pass
+
+
+class OllamaConnectionError(BackendConnectionError):
     """Raised when unable to connect to Ollama API"""
     pass
 
 
-class OllamaResponseError(ChatException):
+class OllamaResponseError(BackendResponseError):
     """Raised when Ollama returns an invalid response"""
     pass
 
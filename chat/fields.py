@@ -0,0 +1,87 @@
+"""Custom model fields for the chat application"""
+
+import base64
+import hashlib
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+from .constants import COMPRESSION_THRESHOLD
+
+# Private-use character marking a compressed value; raw text that happens to
+# start with it is always stored compressed, so reads are never ambiguous.
+COMPRESSED_MARKER = "\ue000"
+
+
+@lru_cache(maxsize=None)
+def get_compression_dictionary():
+    """Load the zlib preset dictionary named by settings.CHAT_COMPRESSION_DICTIONARY
+
+    Returns a (dictionary id, bytes) pair, or ("", None) when none is configured.
+    """
+    path = getattr(settings, "CHAT_COMPRESSION_DICTIONARY", None)
+    if not path:
+        return "", None
+    with open(path, "rb") as f:
+        zdict = f.read()
+    return hashlib.sha1(zdict).hexdigest()[:8], zdict
+
+
+def compress_text(value, threshold=COMPRESSION_THRESHOLD):
+    """Compress text above the threshold into its stored form"""
+    if value is None or (len(value) < threshold and not value.startswith(COMPRESSED_MARKER)):
+        return value
+    dictionary_id, zdict = get_compression_dictionary()
+    compressor = zlib.compressobj(9, zdict=zdict) if zdict else zlib.compressobj(9)
+    data = compressor.compress(value.encode()) + compressor.flush()
+    stored = f"{COMPRESSED_MARKER}{dictionary_id}:{base64.b85encode(data).decode()}"
+    if len(stored) >= len(value) and not value.startswith(COMPRESSED_MARKER):
+        return value
+    return stored
+
+
+def decompress_text(value):
+    """Turn a stored value back into text"""
+    if value is None or not value.startswith(COMPRESSED_MARKER):
+        return value
+    dictionary_id, _, payload = value[1:].partition(":")
+    data = base64.b85decode(payload)
+    if not dictionary_id:
+        return zlib.decompress(data).decode()
+    configured_id, zdict = get_compression_dictionary()
+    if dictionary_id != configured_id:
+        raise ImproperlyConfigured(
+            f"Value was compressed with dictionary {dictionary_id}, "
+            f"but CHAT_COMPRESSION_DICTIONARY is {configured_id or 'not set'}"
+        )
+    decompressor = zlib.decompressobj(zdict=zdict)
+    return (decompressor.decompress(data) + decompressor.flush()).decode()
+
+
+class CompressedTextField(models.TextField):
+    """TextField that stores long values zlib-compressed in the same column
+
+    Values of at least ``threshold`` characters are compressed on save (with
+    the optional preset dictionary) and decompressed when loaded. Pattern
+    lookups such as ``icontains`` only match values stored uncompressed, so
+    don't offer them as a search over the field.
+    """
+
+    def __init__(self, *args, threshold=COMPRESSION_THRESHOLD, **kwargs):
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold != COMPRESSION_THRESHOLD:
+            kwargs["threshold"] = self.threshold
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        return decompress_text(value)
+
+    def get_prep_value(self, value):
+        return compress_text(super().get_prep_value(value), self.threshold)
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from chat.retention import RetentionPolicy, archive_conversations, available_codecs
+from chat.constants import RETENTION_BATCH_SIZE, RETENTION_MAX_AGE_DAYS
+
+
+class Command(BaseCommand):
+    help = "Move idle conversations out of the hot tables into compressed archive rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=RETENTION_MAX_AGE_DAYS,
+            help="Archive conversations not updated for this many days",
+        )
+        parser.add_argument(
+            "--max-messages",
+            type=int,
+            help="Also archive the oldest conversations until at most this many messages remain",
+        )
+        parser.add_argument("--batch-size", type=int, default=RETENTION_BATCH_SIZE)
+        parser.add_argument("--codec", choices=["zstd", "gzip"])
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report what would be archived"
+        )
+
+    def handle(self, *args, **options):
+        codecs = available_codecs()
+        codec = options["codec"] or codecs[0]
+        if codec not in codecs:
+            raise CommandError(f"The {codec} codec is not available")
+
+        policy = RetentionPolicy(options["older_than_days"], options["max_messages"])
+        selected_at = timezone.now()
+        conversation_ids = policy.candidates()
+        if options["dry_run"]:
+            self.stdout.write(f"Would archive {len(conversation_ids)} conversations")
+            return
+
+        batch_size = options["batch_size"]
+        archived_conversations = archived_messages = 0
+        for start in range(0, len(conversation_ids), batch_size):
+            batch = conversation_ids[start:start + batch_size]
+            conversations, messages = archive_conversations(batch, codec, selected_at)
+            archived_conversations += conversations
+            archived_messages += messages
+
+        self.stdout.write(
+            f"Archived {archived_conversations} conversations "
+            f"({archived_messages} messages) with {codec}"
+        )
+        skipped = len(conversation_ids) - archived_conversations
+        if skipped:
+            self.stdout.write(f"Skipped {skipped} conversations that changed while archiving")
@@ -0,0 +1,80 @@
+import json
+import sys
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.backends import get_backend
+from chat.batch import BatchRunner, parse_prompt
+from chat.constants import (
+    BATCH_CONCURRENCY,
+    BATCH_MAX_RETRIES,
+    BATCH_PERSIST_SIZE,
+)
+
+
+class Command(BaseCommand):
+    help = "Run prompts from a JSONL file through the model and write results as JSONL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input",
+            help='JSONL file with one prompt per line, as a string or {"id", "prompt"}; "-" for stdin',
+        )
+        parser.add_argument(
+            "-o", "--output", default="-", help="JSONL file for results (default: stdout)"
+        )
+        parser.add_argument("--backend", help="CHAT_BACKENDS alias (default: the default backend)")
+        parser.add_argument("--model", help="Model name (default: the backend's model)")
+        parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+        parser.add_argument("--retries", type=int, default=BATCH_MAX_RETRIES)
+        parser.add_argument(
+            "--persist",
+            action="store_true",
+            help="Save each successful exchange as a conversation",
+        )
+        parser.add_argument("--persist-batch-size", type=int, default=BATCH_PERSIST_SIZE)
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be at least 1")
+        try:
+            get_backend(options["backend"])
+        except ImproperlyConfigured as e:
+            raise CommandError(e)
+
+        source = sys.stdin if options["input"] == "-" else open(options["input"])
+        output = sys.stdout if options["output"] == "-" else open(options["output"], "w")
+
+        def prompts():
+            for index, line in enumerate(source):
+                if not line.strip():
+                    continue
+                try:
+                    yield parse_prompt(json.loads(line), index)
+                except ValueError as e:
+                    raise CommandError(f"Line {index + 1}: {e}")
+
+        def write_result(result):
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+
+        runner = BatchRunner(
+            concurrency=options["concurrency"],
+            retries=options["retries"],
+            persist=options["persist"],
+            persist_batch_size=options["persist_batch_size"],
+            backend=options["backend"],
+            model=options["model"],
+        )
+        try:
+            report = async_to_sync(runner.run)(prompts(), on_result=write_result)
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if output is not sys.stdout:
+                output.close()
+
+        for key, value in report.as_dict().items():
+            self.stderr.write(f"{key}: {value}")
@@ -0,0 +1,63 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connection
+
+from chat.constants import CONVERSATION_CONTEXT_LIMIT
+from chat.models import Conversation, Message
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure chat turns per second the database sustains (save the user message, "
+        "read the context, save the response) without calling the model. Connections "
+        "are released after each turn as at the end of a request, so the connection "
+        "settings (CONN_MAX_AGE or pool) are part of the measurement."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 4, 16])
+        parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{connection.vendor} ({connection.settings_dict['NAME']}), "
+            f"{Message.objects.count()} messages"
+        )
+        for threads in options["threads"]:
+            turns, errors = self.run(threads, options["seconds"])
+            self.stdout.write(
+                f"{threads} threads: {turns / options['seconds']:.0f} turns/s"
+                + (f", {errors} failed (database locked)" if errors else "")
+            )
+
+    def run(self, threads, seconds):
+        conversations = [Conversation.objects.create(title="benchmark") for _ in range(threads)]
+        deadline = time.monotonic() + seconds
+        counts = [0] * threads
+        errors = [0] * threads
+
+        def work(index):
+            conversation = conversations[index]
+            try:
+                while time.monotonic() < deadline:
+                    try:
+                        Message.objects.create(conversation=conversation, content="question", is_user=True)
+                        list(conversation.get_context_messages(CONVERSATION_CONTEXT_LIMIT))
+                        Message.objects.create(conversation=conversation, content="answer " * 50, is_user=False)
+                        conversation.save(update_fields=["updated_at"])
+                        counts[index] += 1
+                    except OperationalError:
+                        errors[index] += 1
+                    close_old_connections()
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work, args=(index,)) for index in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        Conversation.objects.filter(pk__in=[conversation.pk for conversation in conversations]).delete()
+        return sum(counts), sum(errors)
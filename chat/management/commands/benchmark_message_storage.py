@@ -0,0 +1,78 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Length
+
+from chat.fields import COMPRESSED_MARKER
+from chat.models import Message
+
+
+class Command(BaseCommand):
+    help = "Report message storage size and read latency (run before and after compressing)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sample", type=int, default=1000, help="Messages read per latency measurement"
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        stats = Message.objects.aggregate(
+            rows=Count("pk"),
+            compressed=Count("pk", filter=Q(content__startswith=COMPRESSED_MARKER)),
+            stored_chars=Sum(Length("content")),
+        )
+        self.stdout.write(f"Messages: {stats['rows']} ({stats['compressed']} compressed)")
+        if not stats["rows"]:
+            return
+
+        text_chars = 0
+        for content in Message.objects.values_list("content", flat=True).iterator(chunk_size=2000):
+            text_chars += len(content)
+        self.stdout.write(
+            f"Stored characters: {stats['stored_chars']} for {text_chars} characters of text "
+            f"({stats['stored_chars'] / text_chars:.1%})"
+        )
+
+        table_size = self.table_size()
+        if table_size is not None:
+            # SQLite only returns freed pages to the file after VACUUM
+            self.stdout.write(f"Table size on disk: {table_size / 1024 / 1024:.2f} MiB")
+
+        sample = options["sample"]
+        pks = list(Message.objects.order_by("-pk").values_list("pk", flat=True)[:sample])
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            for message in Message.objects.filter(pk__in=pks).only("content"):
+                message.content
+            timings.append(time.perf_counter() - started)
+        best = min(timings)
+        self.stdout.write(
+            f"Read latency: {best * 1000:.2f} ms for {len(pks)} messages "
+            f"({best / len(pks) * 1e6:.1f} us per message, best of {options['repeat']})"
+        )
+
+    def table_size(self):
+        """Get the bytes used by the message table and its indexes, if the backend can tell"""
+        table = Message._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                # A partitioned table's rows and indexes live in its partitions
+                cursor.execute(
+                    "SELECT pg_total_relation_size(%s::regclass) + COALESCE(("
+                    "  SELECT SUM(pg_total_relation_size(inhrelid)) FROM pg_inherits "
+                    "  WHERE inhparent = %s::regclass"
+                    "), 0)",
+                    [table, table],
+                )
+                return cursor.fetchone()[0]
+            if connection.vendor == "sqlite":
+                try:
+                    cursor.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = %s", [table])
+                except Exception:
+                    return None
+                return cursor.fetchone()[0]
+        return None
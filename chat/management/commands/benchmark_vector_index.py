@@ -0,0 +1,63 @@
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.vector_index import VectorIndex, np, top_k
+
+
+class Command(BaseCommand):
+    help = "Benchmark vector index appends and top-k search on random vectors"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+        parser.add_argument("--dimensions", type=int, default=768)
+        parser.add_argument("--k", type=int, default=4)
+        parser.add_argument("--queries", type=int, default=20)
+        parser.add_argument(
+            "--groups", type=int, default=10_000, help="Distinct conversations the vectors belong to"
+        )
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError("The vector index requires the 'numpy' package")
+        rng = np.random.default_rng(0)
+        dimensions, k = options["dimensions"], options["k"]
+
+        for size in options["sizes"]:
+            with tempfile.TemporaryDirectory() as directory:
+                index = VectorIndex(directory, dimensions)
+                started = time.perf_counter()
+                for start in range(0, size, 50_000):
+                    count = min(50_000, size - start)
+                    index.add(
+                        np.arange(start, start + count),
+                        rng.integers(0, options["groups"], count),
+                        rng.standard_normal((count, dimensions), dtype=np.float32),
+                    )
+                append_seconds = time.perf_counter() - started
+
+                queries = rng.standard_normal((options["queries"], dimensions), dtype=np.float32)
+                index.search(queries[0], k)  # map the file before timing
+                full = self.time_searches(lambda query: index.search(query, k), queries)
+                # Retrieval scores only the conversation's own vectors, loaded from the database
+                records = index.records()
+                conversation = np.array(records[records["group"] == 1])
+                grouped = self.time_searches(
+                    lambda query: top_k(query, conversation["id"], conversation["vector"], k), queries
+                )
+
+            self.stdout.write(
+                f"{size:>10} vectors x {dimensions}: append {size / append_seconds:,.0f} vectors/s, "
+                f"top-{k} search median {full:.1f} ms, "
+                f"within one conversation ({len(conversation)} vectors) {grouped:.2f} ms"
+            )
+
+    def time_searches(self, search, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import Message
+from chat.services import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = "Compute embeddings for messages that have none, e.g. after enabling retrieval"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        missing = Message.objects.filter(embedding__isnull=True).select_related("conversation")
+        embedded = 0
+        for message in missing.iterator(chunk_size=options["batch_size"]):
+            EmbeddingService.embed(message)
+            embedded += 1
+        self.stdout.write(f"Embedded {embedded} messages")
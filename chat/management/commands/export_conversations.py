@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from chat.transfer import TRANSFER_MODELS, close_jsonl, dumps_record, open_jsonl, record_fields
+
+
+class Command(BaseCommand):
+    help = "Stream conversations, their messages and archived conversations to a JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "output", help='JSONL file to write, gzip-compressed if it ends in .gz; "-" for stdout'
+        )
+        parser.add_argument(
+            "--gzip", action="store_true", default=None, help="Compress regardless of the file name"
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=2000, help="Rows fetched per database round trip"
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        output = open_jsonl(options["output"], "w", compress=options["gzip"])
+        counts = {}
+        try:
+            for record_type, model in TRANSFER_MODELS.items():
+                rows = (
+                    model.objects.order_by("pk")
+                    .values(*record_fields(model))
+                    .iterator(chunk_size=chunk_size)
+                )
+                counts[record_type] = 0
+                for values in rows:
+                    output.write(dumps_record(record_type, values))
+                    counts[record_type] += 1
+        finally:
+            close_jsonl(output)
+
+        self.stderr.write(
+            f"Exported {counts['conversation']} conversations, {counts['message']} messages "
+            f"and {counts['archive']} archived conversations"
+        )
@@ -0,0 +1,151 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from chat.transfer import (
+    TRANSFER_MODELS,
+    close_jsonl,
+    loads_record,
+    open_jsonl,
+    preserve_timestamps,
+)
+
+
+# Fields that tell a row this import already inserted from an unrelated row with the same id
+IDENTITY_FIELDS = {
+    "conversation": ("title", "created_at"),
+    "message": ("conversation_id", "is_user", "timestamp"),
+    "archive": ("original_id", "archived_at"),
+}
+
+
+class Command(BaseCommand):
+    help = "Load conversations, messages and archived conversations from a JSONL export"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "input", help='JSONL file to read, gzip-compressed if it ends in .gz; "-" for stdin'
+        )
+        parser.add_argument(
+            "--gzip", action="store_true", default=None, help="Decompress regardless of the file name"
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=1000, help="Rows inserted per transaction"
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="File recording the last committed line; an existing checkpoint resumes the import",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        start_line = self.read_checkpoint(checkpoint, options["input"])
+        if start_line:
+            self.stderr.write(f"Resuming after line {start_line}")
+
+        source = open_jsonl(options["input"], "r", compress=options["gzip"])
+        inserted = dict.fromkeys(TRANSFER_MODELS, 0)
+        skipped = dict.fromkeys(TRANSFER_MODELS, 0)
+        # Messages may only join conversations from the same file
+        conversation_ids = set()
+        batch, batch_type, line_number = [], None, start_line
+
+        def flush(through_line):
+            with transaction.atomic():
+                rows = self.new_rows(batch_type, batch)
+                # bulk_create sends no per-row signals
+                TRANSFER_MODELS[batch_type].objects.bulk_create(rows, batch_size=batch_size)
+            inserted[batch_type] += len(rows)
+            skipped[batch_type] += len(batch) - len(rows)
+            self.write_checkpoint(checkpoint, options["input"], through_line)
+            batch.clear()
+
+        try:
+            with preserve_timestamps():
+                for line_number, line in enumerate(source, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        record_type, instance = loads_record(line)
+                    except (KeyError, TypeError, ValueError) as e:
+                        raise CommandError(f"Line {line_number}: invalid record ({e})")
+                    if record_type == "conversation":
+                        conversation_ids.add(instance.pk)
+                    if line_number <= start_line:
+                        continue
+                    if record_type == "message" and instance.conversation_id not in conversation_ids:
+                        raise CommandError(
+                            f"Line {line_number}: message {instance.pk} belongs to conversation "
+                            f"{instance.conversation_id}, which is not in the file"
+                        )
+                    if batch and (record_type != batch_type or len(batch) >= batch_size):
+                        flush(line_number - 1)
+                    batch_type = record_type
+                    batch.append(instance)
+                if batch:
+                    flush(line_number)
+        finally:
+            close_jsonl(source)
+
+        self.reset_sequences()
+        self.stderr.write(
+            f"Inserted {inserted['conversation']} conversations, {inserted['message']} messages "
+            f"and {inserted['archive']} archived conversations; skipped {skipped['conversation']} "
+            f"conversations, {skipped['message']} messages and {skipped['archive']} archived "
+            "conversations already imported"
+        )
+
+    def new_rows(self, record_type, batch):
+        """Get the rows of a batch not imported yet
+
+        Rows already in the database with the same data were imported by an
+        earlier run and are skipped, so replaying a batch is harmless. An id
+        taken by a different row aborts the import, since inserting around it
+        would attach messages to unrelated conversations.
+        """
+        model = TRANSFER_MODELS[record_type]
+        fields = IDENTITY_FIELDS[record_type]
+        existing = {
+            pk: values
+            for pk, *values in model.objects.filter(
+                pk__in=[instance.pk for instance in batch]
+            ).values_list("pk", *fields)
+        }
+        rows = []
+        for instance in batch:
+            if instance.pk not in existing:
+                rows.append(instance)
+                continue
+            values = [
+                model._meta.get_field(name).to_python(getattr(instance, name)) for name in fields
+            ]
+            if values != existing[instance.pk]:
+                raise CommandError(
+                    f"{record_type.capitalize()} {instance.pk} already exists with different data; "
+                    "import into an empty database"
+                )
+        return rows
+
+    def read_checkpoint(self, checkpoint, source):
+        if not checkpoint or not checkpoint.exists():
+            return 0
+        state = json.loads(checkpoint.read_text())
+        if state.get("input") != source:
+            raise CommandError(f"Checkpoint {checkpoint} belongs to {state.get('input')}")
+        return state["line"]
+
+    def write_checkpoint(self, checkpoint, source, line):
+        if checkpoint:
+            checkpoint.write_text(json.dumps({"input": source, "line": line}))
+
+    def reset_sequences(self):
+        """Move primary key sequences past the imported ids (a no-op on SQLite)"""
+        statements = connection.ops.sequence_reset_sql(no_style(), TRANSFER_MODELS.values())
+        if statements:
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
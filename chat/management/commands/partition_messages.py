@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from chat.constants import PARTITION_MONTHS_AHEAD
+from chat.partitioning import convert_statements, extend_statements, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        "Partition the message table by month on PostgreSQL, or create upcoming "
+        "partitions once it is (run monthly)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=PARTITION_MONTHS_AHEAD,
+            help="Create partitions for this many months after the current one",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Print the SQL instead of running it")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on PostgreSQL")
+
+        with transaction.atomic():
+            converting = not is_partitioned()
+            if converting:
+                statements = convert_statements(options["months_ahead"])
+            else:
+                statements = extend_statements(options["months_ahead"])
+
+            if options["dry_run"]:
+                for statement in statements:
+                    self.stdout.write(f"{statement};")
+                return
+            with connection.cursor() as cursor:
+                for statement in statements:
+                    cursor.execute(statement)
+
+        if converting:
+            self.stdout.write("Partitioned the message table by month")
+        else:
+            self.stdout.write(f"Created {len(statements)} partitions")
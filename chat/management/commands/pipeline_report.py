@@ -0,0 +1,22 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from chat.pipeline import stage_report
+
+
+class Command(BaseCommand):
+    help = "Report runs, average duration, failures and retries of each post-turn pipeline stage"
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stderr.write(
+                "The local-memory cache is per process; configure a shared cache "
+                "to see the web workers' measurements"
+            )
+        for name, stats in stage_report().items():
+            average = f"{stats['avg_ms']} ms" if stats["avg_ms"] is not None else "n/a"
+            self.stdout.write(
+                f"{name}: {stats['count']} runs, {average} average, "
+                f"{stats['failures']} failed, {stats['retries']} retries"
+            )
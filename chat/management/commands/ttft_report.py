@@ -0,0 +1,23 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from chat.services import PrefetchService
+
+
+class Command(BaseCommand):
+    help = "Report average time to first token with and without prompt prefetch"
+
+    def handle(self, *args, **options):
+        if isinstance(caches["default"], LocMemCache):
+            self.stderr.write(
+                "The local-memory cache is per process; configure a shared cache "
+                "to see the web workers' measurements"
+            )
+        report = PrefetchService.ttft_report()
+        for state in ("warm", "cold"):
+            stats = report[state]
+            average = f"{stats['avg_ms']} ms" if stats["avg_ms"] is not None else "n/a"
+            self.stdout.write(f"{state.capitalize()}: {average} over {stats['count']} responses")
+        if "improvement_ms" in report:
+            self.stdout.write(f"Prefetch saves {report['improvement_ms']} ms on average")
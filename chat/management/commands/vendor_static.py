@@ -0,0 +1,50 @@
+import re
+from pathlib import Path
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.constants import VENDOR_ASSETS
+
+# Source maps aren't vendored, and collectstatic fails on references to missing files
+SOURCE_MAP_COMMENT = re.compile(rb"^[ \t]*(?://# sourceMappingURL=\S+|/\*# sourceMappingURL=\S+ \*/)[ \t]*$", re.M)
+
+
+def strip_source_map(path, content):
+    """Remove the sourceMappingURL comment from a CSS or JavaScript file"""
+    if Path(path).suffix in (".css", ".js"):
+        return SOURCE_MAP_COMMENT.sub(b"", content)
+    return content
+
+
+class Command(BaseCommand):
+    help = "Download the pinned third-party assets into static/vendor to serve them ourselves"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Download files that already exist")
+        parser.add_argument(
+            "--static-dir",
+            default=Path(settings.BASE_DIR) / "static",
+            type=Path,
+            help="Static directory to download into (default: static/)",
+        )
+
+    def handle(self, *args, **options):
+        static_dir = options["static_dir"]
+        with httpx.Client(timeout=30.0, follow_redirects=True) as client:
+            for path, url in VENDOR_ASSETS.items():
+                target = static_dir / path
+                if target.exists() and not options["force"]:
+                    self.stdout.write(f"Skipped {path} (exists)")
+                    continue
+                try:
+                    response = client.get(url)
+                    response.raise_for_status()
+                except httpx.HTTPError as e:
+                    raise CommandError(f"Could not download {url}: {e}")
+                content = strip_source_map(path, response.content)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                target.write_bytes(content)
+                self.stdout.write(f"Downloaded {path} ({len(content)} bytes)")
+        self.stdout.write("Run collectstatic to hash and compress them")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversation_chat_conver_updated_1f6ffe_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StreamEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['channel', 'id'], name='chat_stream_channel_9aeffe_idx')],
+            },
+        ),
+    ]
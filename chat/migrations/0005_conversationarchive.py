@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_streamevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=200)),
+                ('message_count', models.PositiveIntegerField()),
+                ('codec', models.CharField(max_length=10)),
+                ('payload', models.BinaryField()),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-updated_at'],
+            },
+        ),
+    ]
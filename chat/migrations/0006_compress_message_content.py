@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:22
+
+import chat.fields
+from django.db import migrations
+from django.db.models import Q, TextField, Value
+from django.db.models.functions import Cast, Length
+
+BATCH_SIZE = 500
+
+
+def compress_long_messages(apps, schema_editor):
+    """Rewrite long message bodies in batches so they are stored compressed"""
+    Message = apps.get_model("chat", "Message")
+    threshold = Message._meta.get_field("content").threshold
+    long_messages = (
+        Message.objects.annotate(content_length=Length("content"))
+        .filter(
+            Q(content_length__gte=threshold)
+            | Q(content__startswith=chat.fields.COMPRESSED_MARKER)
+        )
+        .order_by("pk")
+    )
+    last_pk = 0
+    while True:
+        # Read the plain text without the field's decompression, then save it
+        # back through the field, which compresses it
+        rows = list(
+            long_messages.filter(pk__gt=last_pk)
+            .values_list("pk", Cast("content", TextField()))[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        batch = [Message(pk=pk, content=content) for pk, content in rows]
+        Message.objects.bulk_update(batch, ["content"])
+        last_pk = rows[-1][0]
+
+
+def decompress_messages(apps, schema_editor):
+    """Store every message body as plain text again"""
+    Message = apps.get_model("chat", "Message")
+    compressed = Message.objects.filter(
+        content__startswith=chat.fields.COMPRESSED_MARKER
+    ).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(compressed.filter(pk__gt=last_pk).only("pk", "content")[:BATCH_SIZE])
+        if not batch:
+            break
+        for message in batch:
+            # Value() with a plain TextField bypasses compression on write
+            Message.objects.filter(pk=message.pk).update(
+                content=Value(message.content, output_field=TextField())
+            )
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversationarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=chat.fields.CompressedTextField(),
+        ),
+        migrations.RunPython(compress_long_messages, decompress_messages),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_compress_message_content'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['timestamp'], name='chat_messag_timesta_6494d7_idx'),
+        ),
+    ]
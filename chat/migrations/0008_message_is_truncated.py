@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_message_chat_messag_timesta_6494d7_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='is_truncated',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_message_is_truncated'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='backend',
+            field=models.CharField(blank=True, help_text='CHAT_BACKENDS alias; blank for the default', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='model',
+            field=models.CharField(blank=True, help_text="Model name; blank for the backend's default", max_length=100),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='options',
+            field=models.JSONField(blank=True, default=dict, help_text='Generation options: num_ctx, num_predict, temperature'),
+        ),
+    ]
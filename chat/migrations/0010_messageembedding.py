@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_conversation_generation_settings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageEmbedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='embedding', to='chat.message')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:35
+
+import chat.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_messageembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='rendered_html',
+            field=chat.fields.CompressedTextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='token_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
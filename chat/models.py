@@ -1,6 +1,26 @@
-from django.db import models
+from array import array
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from django.utils import timezone
 
+from .backends import backend_configs
+from .constants import TITLE_TRUNCATE_LENGTH, GENERATION_OPTIONS
+from .fields import CompressedTextField
+
+
+def truncate_title(content):
+    """Build a conversation title from the start of a message"""
+    if len(content) > TITLE_TRUNCATE_LENGTH:
+        return content[:TITLE_TRUNCATE_LENGTH] + "..."
+    return content
+
+
+def clean_generation_options(options):
+    """Keep only the supported generation options"""
+    return {key: value for key, value in (options or {}).items() if key in GENERATION_OPTIONS}
+
 
 class ConversationManager(models.Manager):
     """Custom manager for Conversation model"""
@@ -15,18 +35,47 @@ class ConversationManager(models.Manager):
     
     def create_with_message(self, message_content):
         """Create a conversation with an initial message"""
-        title = (
-            message_content[:50] + "..."
-            if len(message_content) > 50
-            else message_content
-        )
-        conversation = self.create(title=title)
+        conversation = self.create(title=truncate_title(message_content))
         conversation.messages.create(content=message_content, is_user=True)
         return conversation
 
+    def bulk_create_exchanges(self, exchanges, backend=None, model=None):
+        """Create one conversation per (prompt, response) pair with bulk inserts
+
+        Runs in a transaction, so a failed insert leaves no empty conversations.
+        """
+        with transaction.atomic():
+            conversations = self.bulk_create(
+                [
+                    self.model(
+                        title=truncate_title(prompt), backend=backend or "", model=model or ""
+                    )
+                    for prompt, _ in exchanges
+                ]
+            )
+            messages = []
+            for conversation, (prompt, response) in zip(conversations, exchanges):
+                messages.append(
+                    Message(conversation=conversation, content=prompt, is_user=True)
+                )
+                messages.append(
+                    Message(conversation=conversation, content=response, is_user=False)
+                )
+            Message.objects.bulk_create(messages)
+        return conversations
+
 
 class Conversation(models.Model):
     title = models.CharField(max_length=200, default="New Chat")
+    backend = models.CharField(
+        max_length=50, blank=True, help_text="CHAT_BACKENDS alias; blank for the default"
+    )
+    model = models.CharField(
+        max_length=100, blank=True, help_text="Model name; blank for the backend's default"
+    )
+    options = models.JSONField(
+        default=dict, blank=True, help_text="Generation options: num_ctx, num_predict, temperature"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -51,24 +100,77 @@ class Conversation(models.Model):
         """Get the most recent message in this conversation"""
         return self.messages.last()
     
+    def clean(self):
+        errors = {}
+        if self.backend and self.backend not in backend_configs():
+            errors["backend"] = f"No chat backend named '{self.backend}' in CHAT_BACKENDS"
+        unknown = set(self.options or {}) - set(GENERATION_OPTIONS)
+        if unknown:
+            errors["options"] = f"Unsupported options: {', '.join(sorted(unknown))}"
+        if errors:
+            raise ValidationError(errors)
+
+    def generation_settings(self):
+        """Get the backend, model and options to generate responses with"""
+        return {
+            "backend": self.backend or None,
+            "model": self.model or None,
+            "options": clean_generation_options(self.options),
+        }
+
     def get_context_messages(self, limit=10):
-        """Get recent messages for context"""
-        return list(self.messages.all()[:limit])
+        """Get the most recent messages for context, oldest first"""
+        messages = list(self.messages.order_by("-timestamp")[:limit])
+        messages.reverse()
+        return messages
 
 
 class Message(models.Model):
     conversation = models.ForeignKey(
         Conversation, on_delete=models.CASCADE, related_name="messages"
     )
-    content = models.TextField()
+    content = CompressedTextField()
     is_user = models.BooleanField()
+    is_truncated = models.BooleanField(default=False)
+    rendered_html = CompressedTextField(blank=True, default="")
+    token_count = models.PositiveIntegerField(null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["timestamp"]
+        indexes = [
+            models.Index(fields=['timestamp']),
+            models.Index(fields=['conversation', 'timestamp']),
+        ]
 
     def __str__(self):
         return f"{'User' if self.is_user else 'AI'}: {self.content[:50]}..."
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded content, so save() can tell when it changed
+        instance._loaded_content = instance.__dict__.get("content")
+        return instance
+
+    def save(self, *args, **kwargs):
+        """Save the message, dropping what was derived from its content if that changed
+
+        The rendered HTML, token count and embedding are cleared; scheduling
+        the message on the post-turn pipeline again recomputes them.
+        """
+        loaded = getattr(self, "_loaded_content", None)
+        content_changed = loaded is not None and self.__dict__.get("content", loaded) != loaded
+        if content_changed:
+            self.rendered_html = ""
+            self.token_count = None
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "rendered_html", "token_count"}
+        super().save(*args, **kwargs)
+        if content_changed:
+            MessageEmbedding.objects.filter(message=self).delete()
+        self._loaded_content = self.__dict__.get("content")
     
     @property
     def role(self):
@@ -83,3 +185,73 @@ class Message(models.Model):
             if len(self.content) > 100
             else self.content
         )
+
+
+class MessageEmbedding(models.Model):
+    """Embedding vector of a message, stored as packed float32 values"""
+
+    message = models.OneToOneField(
+        Message, on_delete=models.CASCADE, related_name="embedding"
+    )
+    model = models.CharField(max_length=100)
+    vector = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Embedding of message {self.message_id}"
+
+    @staticmethod
+    def pack(values):
+        return array("f", values).tobytes()
+
+    def unpack(self):
+        values = array("f")
+        values.frombytes(bytes(self.vector))
+        return values.tolist()
+
+
+class ConversationArchive(models.Model):
+    """Compressed copy of a conversation moved out of the hot tables"""
+
+    original_id = models.BigIntegerField(unique=True)
+    title = models.CharField(max_length=200)
+    message_count = models.PositiveIntegerField()
+    codec = models.CharField(max_length=10)
+    payload = models.BinaryField()
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-updated_at"]
+
+    def __str__(self):
+        return f"{self.title} (archived)"
+
+
+class StreamEventManager(models.Manager):
+    """Custom manager for StreamEvent model"""
+
+    def expired(self, ttl):
+        """Get events older than ttl seconds"""
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        return self.get_queryset().filter(created_at__lt=cutoff)
+
+
+class StreamEvent(models.Model):
+    """Token event stored for the database-backed token bus"""
+
+    channel = models.CharField(max_length=100)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = StreamEventManager()
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["channel", "id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.channel}: {self.payload.get('type')}"
@@ -0,0 +1,131 @@
+"""Monthly range partitioning of the message table on PostgreSQL
+
+Converting rebuilds ``chat_message`` as a table partitioned by
+``timestamp``, with one partition per month and a default partition for
+anything outside them. PostgreSQL requires the partition key in every
+unique constraint, so the primary key becomes ``(id, timestamp)`` and
+foreign keys pointing at messages (from MessageEmbedding) are dropped at the
+database level; the ORM still deletes embeddings with their messages.
+Indexes, check constraints and the conversation foreign key are kept.
+"""
+
+from datetime import date
+
+from django.db import connection
+
+from .models import Message
+
+TABLE = Message._meta.db_table
+
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [TABLE])
+        return cursor.fetchone()[0] == "p"
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def months_between(first, last):
+    """Get the first day of each month from first to last, inclusive"""
+    month = first.replace(day=1)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+
+def partition_name(month):
+    return f"{TABLE}_p{month:%Y%m}"
+
+
+def existing_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def create_partition_sql(parent, month):
+    return (
+        f'CREATE TABLE "{partition_name(month)}" PARTITION OF "{parent}" '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+        f"TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+    )
+
+
+def extend_statements(months_ahead, today=None):
+    """SQL creating the missing monthly partitions up to months_ahead from now"""
+    today = today or date.today()
+    existing = existing_partitions()
+    return [
+        create_partition_sql(TABLE, month)
+        for month in months_between(today, add_months(today, months_ahead))
+        if partition_name(month) not in existing
+    ]
+
+
+def convert_statements(months_ahead, today=None):
+    """SQL rebuilding the message table as a partitioned table, for one transaction"""
+    today = today or date.today()
+    new_table = f"{TABLE}_partitioned"
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{TABLE}"')
+        oldest = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes WHERE tablename = %s AND indexname NOT IN ("
+            "  SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u')"
+            ")",
+            [TABLE, TABLE],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE confrelid = %s::regclass AND contype = 'f'",
+            [TABLE],
+        )
+        referencing = cursor.fetchall()
+
+    first_month = oldest.date() if oldest else today
+    statements = [
+        f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE',
+        f'CREATE TABLE "{new_table}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS '
+        f'INCLUDING IDENTITY) PARTITION BY RANGE ("timestamp")',
+    ]
+    statements += [
+        create_partition_sql(new_table, month)
+        for month in months_between(first_month, add_months(today, months_ahead))
+    ]
+    statements += [
+        f'CREATE TABLE "{TABLE}_default" PARTITION OF "{new_table}" DEFAULT',
+        f'INSERT INTO "{new_table}" OVERRIDING SYSTEM VALUE SELECT * FROM "{TABLE}"',
+    ]
+    statements += [
+        f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}"' for table, name in referencing
+    ]
+    statements += [
+        f'DROP TABLE "{TABLE}"',
+        f'ALTER TABLE "{new_table}" RENAME TO "{TABLE}"',
+        f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_pkey" PRIMARY KEY ("id", "timestamp")',
+    ]
+    statements += indexes
+    statements += [
+        f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{name}" {definition}'
+        for name, definition in foreign_keys
+    ]
+    statements.append(
+        f"SELECT setval(pg_get_serial_sequence('\"{TABLE}\"', 'id'), "
+        f'COALESCE((SELECT MAX("id") FROM "{TABLE}"), 0) + 1, false)'
+    )
+    return statements
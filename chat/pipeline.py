@@ -0,0 +1,210 @@
+"""Post-turn pipeline of background stages run on saved messages
+
+Each saved message is queued once its transaction commits and processed by
+a small pool of worker threads, so none of this work delays the request or
+the SSE ``done`` event. Stages run in order and independently: a stage that
+keeps failing after its retries is logged and skipped. Stages are idempotent,
+so running one again for the same message is harmless.
+
+A stage is a function taking the message and returning False when it had
+nothing to do; register it with ``@stage("name")`` and enable it in
+PIPELINE_STAGES or settings.CHAT_PIPELINE_STAGES.
+"""
+
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .constants import (
+    PIPELINE_STAGES,
+    PIPELINE_CONCURRENCY,
+    PIPELINE_MAX_RETRIES,
+    PIPELINE_RETRY_BACKOFF,
+    TITLE_PROMPT,
+    TITLE_MAX_TOKENS,
+    TITLE_SOURCE_LENGTH,
+)
+from .models import Conversation, Message, truncate_title
+
+logger = logging.getLogger(__name__)
+
+STAGES = {}
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def stage(name):
+    """Register a function as a pipeline stage"""
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+
+def estimate_tokens(text):
+    """Approximate a text's token count from its words and punctuation"""
+    return round(len(TOKEN_PATTERN.findall(text)) * 1.3)
+
+
+@stage("tokens")
+def count_tokens(message):
+    """Store the token count, unless the model server already reported it"""
+    if message.token_count is not None:
+        return False
+    Message.objects.filter(pk=message.pk).update(token_count=estimate_tokens(message.content))
+
+
+@stage("render")
+def render_message(message):
+    """Store the rendered HTML of an AI message"""
+    from .rendering import render_markdown
+
+    if message.is_user:
+        return False
+    Message.objects.filter(pk=message.pk).update(rendered_html=str(render_markdown(message.content)))
+
+
+@stage("title")
+def generate_title(message):
+    """Replace the truncated title after the first response with one written by the model"""
+    from .services import OllamaService
+
+    if message.is_user:
+        return False
+    conversation = message.conversation
+    messages = list(conversation.messages.order_by("timestamp", "pk")[:2])
+    if len(messages) < 2 or messages[1].pk != message.pk or not messages[0].is_user:
+        return False
+    fallback = truncate_title(messages[0].content)
+    if conversation.title != fallback:
+        # Already titled, or renamed
+        return False
+
+    generation_settings = conversation.generation_settings()
+    response = async_to_sync(OllamaService.get_completion)(
+        [{
+            "role": "user",
+            "content": TITLE_PROMPT.format(message=messages[0].content[:TITLE_SOURCE_LENGTH]),
+        }],
+        backend=generation_settings["backend"],
+        model=generation_settings["model"],
+        options={**generation_settings["options"], "num_predict": TITLE_MAX_TOKENS},
+    )
+    lines = [line for line in response.strip().splitlines() if line.strip()]
+    title = lines[0].strip().strip("\"'*#").strip() if lines else ""
+    if not title:
+        return False
+    # Only replace the fallback title, in case the conversation was renamed meanwhile
+    Conversation.objects.filter(pk=conversation.pk, title=fallback).update(
+        title=truncate_title(title)
+    )
+
+
+@stage("embed")
+def embed_message(message):
+    """Embed and index the message for retrieval"""
+    from .services import EmbeddingService
+
+    if not EmbeddingService.enabled():
+        return False
+    EmbeddingService.embed(message)
+
+
+class PostTurnPipeline:
+    """Runs the enabled stages for messages on a bounded pool of worker threads"""
+
+    def __init__(self, stages, concurrency=PIPELINE_CONCURRENCY,
+                 retries=PIPELINE_MAX_RETRIES, backoff=PIPELINE_RETRY_BACKOFF):
+        unknown = [name for name in stages if name not in STAGES]
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages: {', '.join(unknown)}")
+        self.stages = tuple(stages)
+        self.retries = retries
+        self.backoff = backoff
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="chat-pipeline"
+        )
+
+    def schedule(self, message):
+        """Process a message in the background once the current transaction commits"""
+        if self.stages:
+            transaction.on_commit(lambda: self.executor.submit(self.process, message.pk))
+
+    def process(self, message_id):
+        """Run every stage for a message"""
+        try:
+            for name in self.stages:
+                # Reload so each stage sees what the previous ones saved
+                message = Message.objects.select_related("conversation").filter(pk=message_id).first()
+                if message is None:
+                    return
+                self.run_stage(name, message)
+        finally:
+            connection.close()
+
+    def run_stage(self, name, message):
+        """Run one stage with retries, recording its duration; returns whether it succeeded"""
+        for attempt in range(self.retries + 1):
+            started = time.monotonic()
+            try:
+                result = STAGES[name](message)
+            except Exception as e:
+                if attempt == self.retries:
+                    record_stage(name, time.monotonic() - started, failed=True, retries=attempt)
+                    logger.warning("Pipeline stage %s failed for message %s: %s", name, message.pk, e)
+                    return False
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                if result is not False:
+                    record_stage(name, time.monotonic() - started, retries=attempt)
+                return True
+
+
+def record_stage(name, seconds, failed=False, retries=0):
+    """Add a stage run to the shared per-stage totals"""
+    prefix = f"chat:pipeline:{name}"
+    for key in ("count", "total_ms", "failures", "retries"):
+        cache.add(f"{prefix}:{key}", 0, None)
+    cache.incr(f"{prefix}:count")
+    cache.incr(f"{prefix}:total_ms", round(seconds * 1000))
+    if failed:
+        cache.incr(f"{prefix}:failures")
+    if retries:
+        cache.incr(f"{prefix}:retries", retries)
+
+
+def stage_report():
+    """Get the number of runs, average duration, failures and retries of each stage"""
+    report = {}
+    for name in STAGES:
+        prefix = f"chat:pipeline:{name}"
+        values = cache.get_many([f"{prefix}:{key}" for key in ("count", "total_ms", "failures", "retries")])
+        count = values.get(f"{prefix}:count", 0)
+        total = values.get(f"{prefix}:total_ms", 0)
+        report[name] = {
+            "count": count,
+            "avg_ms": round(total / count) if count else None,
+            "failures": values.get(f"{prefix}:failures", 0),
+            "retries": values.get(f"{prefix}:retries", 0),
+        }
+    return report
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_pipeline():
+    """Get the pipeline running the stages in settings.CHAT_PIPELINE_STAGES"""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = PostTurnPipeline(getattr(settings, "CHAT_PIPELINE_STAGES", PIPELINE_STAGES))
+        return _pipeline
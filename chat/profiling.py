@@ -0,0 +1,232 @@
+"""Opt-in request profiling: timing spans, Server-Timing and slow-request traces
+
+With ``CHAT_PROFILING = True``, ProfilingMiddleware starts a trace for each
+request. Code marks the work it does with ``span()``, as a context manager
+or decorator; spans outside a traced request cost almost nothing. Database
+queries are timed automatically. The totals per span name are sent in a
+``Server-Timing`` header, and requests slower than
+``CHAT_PROFILING_SLOW_MS`` are logged to the ``chat.profiling`` logger as
+one JSON object.
+
+Streaming responses send their headers before the body is generated, so
+spans recorded while streaming only appear in the slow-request log.
+
+With DEBUG on, a request sending ``X-Chat-Profile: cprofile`` (or
+``pyinstrument``, if installed) is also profiled, and the dump is written to
+``CHAT_PROFILE_DIR``; its file name is returned in ``X-Chat-Profile-Dump``.
+"""
+
+import cProfile
+import contextvars
+import json
+import logging
+import threading
+import time
+from contextlib import ContextDecorator
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from .constants import PROFILING_SLOW_MS, PROFILE_DUMP_DIR
+
+logger = logging.getLogger(__name__)
+
+_current_trace = contextvars.ContextVar("chat_trace", default=None)
+
+
+class Trace:
+    """Timed spans of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+        self.db_queries = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, started, duration):
+        with self._lock:
+            self.spans.append((name, started - self.started, duration))
+
+    def duration(self):
+        return time.perf_counter() - self.started
+
+    def totals(self):
+        """Get the number of spans and their total seconds per name"""
+        totals = {}
+        with self._lock:
+            for name, _, duration in self.spans:
+                count, total = totals.get(name, (0, 0.0))
+                totals[name] = (count + 1, total + duration)
+        return totals
+
+    def server_timing(self):
+        """Format the span totals as a Server-Timing header value"""
+        metrics = [
+            f'{name};dur={total * 1000:.1f};desc="{count}x"'
+            for name, (count, total) in self.totals().items()
+        ]
+        metrics.append(f"total;dur={self.duration() * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def as_dict(self):
+        with self._lock:
+            spans = [
+                {"name": name, "start_ms": round(start * 1000, 1), "duration_ms": round(duration * 1000, 1)}
+                for name, start, duration in self.spans
+            ]
+        return {
+            "duration_ms": round(self.duration() * 1000, 1),
+            "db_queries": self.db_queries,
+            "spans": spans,
+        }
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        """Database execute wrapper timing each query as a "db" span"""
+        self.db_queries += 1
+        with span("db"):
+            return execute(sql, params, many, context)
+
+
+class span(ContextDecorator):
+    """Time a block, or every call of a function, under a name in the current trace"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def _recreate_cm(self):
+        # A decorated function may run in several threads at once
+        return span(self.name)
+
+    def __enter__(self):
+        self.trace = _current_trace.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.trace is not None:
+            self.trace.add(self.name, self.started, time.perf_counter() - self.started)
+        return False
+
+
+def record_span(name, started):
+    """Add a span from a time.perf_counter() reading until now to the current trace"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, time.perf_counter() - started)
+
+
+def in_request_context(func):
+    """Wrap func to run in a copy of the current context, so a thread records into the request's trace"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+class ProfilingMiddleware:
+    """Trace requests when settings.CHAT_PROFILING is on"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "CHAT_PROFILING", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "CHAT_PROFILING_SLOW_MS", PROFILING_SLOW_MS)
+
+    def __call__(self, request):
+        trace = Trace()
+        token = _current_trace.set(trace)
+        try:
+            with connection.execute_wrapper(trace.execute_wrapper):
+                profiler = request.headers.get("X-Chat-Profile") if settings.DEBUG else None
+                if profiler:
+                    response = self.profile(request, profiler)
+                else:
+                    response = self.get_response(request)
+        finally:
+            _current_trace.reset(token)
+
+        response["Server-Timing"] = trace.server_timing()
+        if response.streaming:
+            self.finish_when_streamed(request, response, trace)
+        else:
+            self.finish(request, response, trace)
+        return response
+
+    def finish(self, request, response, trace, elapsed=None):
+        """Log the trace if the request was slow
+
+        ``elapsed`` is the time that counts, by default the whole request.
+        """
+        if elapsed is None:
+            elapsed = trace.duration()
+        if elapsed * 1000 >= self.slow_ms:
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                **trace.as_dict(),
+            }))
+
+    def finish_when_streamed(self, request, response, trace):
+        """Finish the trace once the response body has been sent, or the client went away
+
+        A stream counts as slow when its first chunk was, since a long
+        response takes long to stream however fast it starts.
+        """
+        content = response.streaming_content
+        first_chunk = {}
+
+        def record_first_chunk():
+            if not first_chunk:
+                first_chunk["elapsed"] = trace.duration()
+                trace.add("stream.first_chunk", trace.started, first_chunk["elapsed"])
+
+        if response.is_async:
+            async def wrapped():
+                try:
+                    async for chunk in content:
+                        record_first_chunk()
+                        yield chunk
+                finally:
+                    self.finish(request, response, trace, first_chunk.get("elapsed"))
+        else:
+            def wrapped():
+                try:
+                    for chunk in content:
+                        record_first_chunk()
+                        yield chunk
+                finally:
+                    self.finish(request, response, trace, first_chunk.get("elapsed"))
+
+        response.streaming_content = wrapped()
+
+    def profile(self, request, profiler):
+        """Handle the request under cProfile or pyinstrument and write the dump"""
+        directory = Path(
+            getattr(settings, "CHAT_PROFILE_DIR", Path(settings.BASE_DIR) / PROFILE_DUMP_DIR)
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{request.path.strip('/').replace('/', '_') or 'root'}"
+
+        if profiler == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                logger.warning("X-Chat-Profile: pyinstrument is not installed")
+                return self.get_response(request)
+            with Profiler() as session:
+                response = self.get_response(request)
+            path = directory / f"{name}.html"
+            path.write_text(session.output_html())
+        elif profiler == "cprofile":
+            session = cProfile.Profile()
+            response = session.runcall(self.get_response, request)
+            path = directory / f"{name}.prof"
+            session.dump_stats(path)
+        else:
+            return self.get_response(request)
+
+        response["X-Chat-Profile-Dump"] = path.name
+        return response
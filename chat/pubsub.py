@@ -0,0 +1,192 @@
+"""Pub/sub bus for fanning generated tokens out to SSE subscribers
+
+Generations publish events (``token``, ``done``, ``error``) to a per-message
+channel; any worker holding an SSE connection for that message subscribes to
+the channel. Every backend keeps a channel's history until it expires, so a
+subscriber that connects late still replays the stream from the start.
+"""
+
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from .constants import (
+    TOKEN_BUS_BACKEND,
+    TOKEN_CHANNEL_TTL,
+    TOKEN_SUBSCRIBE_TIMEOUT,
+    TOKEN_POLL_INTERVAL,
+    ERROR_MESSAGES,
+)
+
+TERMINAL_EVENTS = ("done", "error")
+
+
+def channel_for_message(message_id):
+    """Get the channel name for the response to a user message"""
+    return f"chat:message:{message_id}"
+
+
+def is_terminal(event):
+    """Whether an event ends its channel"""
+    return event.get("type") in TERMINAL_EVENTS
+
+
+class TokenBus:
+    """Base class for per-message token channels"""
+
+    def publish(self, channel, event):
+        """Append an event to a channel"""
+        raise NotImplementedError
+
+    def subscribe(self, channel, timeout=TOKEN_SUBSCRIBE_TIMEOUT):
+        """Yield a channel's events from the start until a terminal event"""
+        raise NotImplementedError
+
+    def timeout_event(self):
+        return {"type": "error", "content": ERROR_MESSAGES["STREAM_TIMEOUT"]}
+
+
+class InProcessTokenBus(TokenBus):
+    """Token bus shared by the threads of a single worker process"""
+
+    def __init__(self, channel_ttl=TOKEN_CHANNEL_TTL):
+        self.channel_ttl = channel_ttl
+        self._channels = {}
+        self._condition = threading.Condition()
+
+    def publish(self, channel, event):
+        with self._condition:
+            self._expire()
+            events, _ = self._channels.get(channel, ([], None))
+            events.append(event)
+            self._channels[channel] = (events, time.monotonic())
+            self._condition.notify_all()
+
+    def subscribe(self, channel, timeout=TOKEN_SUBSCRIBE_TIMEOUT):
+        position = 0
+        while True:
+            deadline = time.monotonic() + timeout
+            with self._condition:
+                while position >= len(self._events(channel)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._events(channel)[position:]
+            if not batch:
+                yield self.timeout_event()
+                return
+            position += len(batch)
+            for event in batch:
+                yield event
+                if is_terminal(event):
+                    return
+
+    def _events(self, channel):
+        return self._channels.get(channel, ([], None))[0]
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.channel_ttl
+        for channel, (_, last_publish) in list(self._channels.items()):
+            if last_publish < cutoff:
+                del self._channels[channel]
+
+
+class DatabaseTokenBus(TokenBus):
+    """Token bus that persists events in the database and polls for them
+
+    Works with any database backend, so SSE subscribers on every web node see
+    the same channels without extra infrastructure.
+    """
+
+    def __init__(self, channel_ttl=TOKEN_CHANNEL_TTL, poll_interval=TOKEN_POLL_INTERVAL):
+        self.channel_ttl = channel_ttl
+        self.poll_interval = poll_interval
+
+    def publish(self, channel, event):
+        from .models import StreamEvent
+
+        StreamEvent.objects.create(channel=channel, payload=event)
+        if is_terminal(event):
+            StreamEvent.objects.expired(self.channel_ttl).delete()
+
+    def subscribe(self, channel, timeout=TOKEN_SUBSCRIBE_TIMEOUT):
+        from .models import StreamEvent
+
+        last_id = 0
+        deadline = time.monotonic() + timeout
+        while True:
+            batch = list(
+                StreamEvent.objects.filter(channel=channel, id__gt=last_id)
+                .order_by("id")
+                .values_list("id", "payload")
+            )
+            if not batch:
+                if time.monotonic() >= deadline:
+                    yield self.timeout_event()
+                    return
+                time.sleep(self.poll_interval)
+                continue
+            deadline = time.monotonic() + timeout
+            for last_id, event in batch:
+                yield event
+                if is_terminal(event):
+                    return
+
+
+class RedisTokenBus(TokenBus):
+    """Token bus backed by Redis streams
+
+    Any server speaking the Redis protocol with stream support works. Requires
+    the ``redis`` package, unless an already connected ``client`` is passed.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", channel_ttl=TOKEN_CHANNEL_TTL, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImproperlyConfigured("RedisTokenBus requires the 'redis' package")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.channel_ttl = channel_ttl
+
+    def publish(self, channel, event):
+        pipeline = self.client.pipeline()
+        pipeline.xadd(channel, {"event": json.dumps(event)})
+        pipeline.expire(channel, self.channel_ttl)
+        pipeline.execute()
+
+    def subscribe(self, channel, timeout=TOKEN_SUBSCRIBE_TIMEOUT):
+        last_id = "0-0"
+        while True:
+            response = self.client.xread(
+                {channel: last_id}, block=int(timeout * 1000)
+            )
+            if not response:
+                yield self.timeout_event()
+                return
+            for last_id, fields in response[0][1]:
+                event = json.loads(fields[b"event"])
+                yield event
+                if is_terminal(event):
+                    return
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_token_bus():
+    """Get the token bus configured by settings.CHAT_TOKEN_BUS"""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            backend = getattr(settings, "CHAT_TOKEN_BUS", TOKEN_BUS_BACKEND)
+            options = getattr(settings, "CHAT_TOKEN_BUS_OPTIONS", {})
+            _bus = import_string(backend)(**options)
+        return _bus
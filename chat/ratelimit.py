@@ -0,0 +1,158 @@
+"""Token-bucket rate limiting and generated-token quotas
+
+Each client is identified by its IP address and, when it sends one, its
+session cookie; a request has to fit in the buckets of both. Buckets live in
+Django's cache so all workers share them when the cache is shared (Redis,
+Memcached, database). Updates are read-modify-write, so concurrent requests
+from one client may occasionally be admitted slightly over the limit.
+
+Limits are set with the CHAT_RATE_LIMITS setting, mapping a scope to
+``(capacity, refill per second)`` or None to disable it:
+
+- ``requests``: one token per request to a rate-limited view
+- ``tokens``: generated tokens, debited with the model's ``eval_count``
+  after each response, or each prompt of a batch; new requests, and the
+  remaining prompts of a batch, are refused while it is overdrawn
+"""
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from .constants import RATE_LIMITS, RATE_LIMITED_VIEWS, ERROR_MESSAGES
+
+
+class TokenBucket:
+    """A bucket per identity holding up to ``capacity`` tokens, refilled continuously"""
+
+    def __init__(self, scope, capacity, refill_rate):
+        self.scope = scope
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+
+    def key(self, identity):
+        return f"chat:ratelimit:{self.scope}:{identity}"
+
+    def levels(self, identities, now):
+        """Get the current level of each identity's bucket"""
+        keys = {identity: self.key(identity) for identity in identities}
+        states = cache.get_many(keys.values())
+        levels = {}
+        for identity, key in keys.items():
+            level, updated = states.get(key, (self.capacity, now))
+            levels[identity] = min(self.capacity, level + (now - updated) * self.refill_rate)
+        return levels
+
+    def timeout(self, level):
+        """Get the seconds until a bucket at this level is full again
+
+        Buckets are kept that long, since a missing bucket counts as full;
+        an overdrawn one is kept until the overdraft is repaid.
+        """
+        return max(1, math.ceil((self.capacity - level) / self.refill_rate))
+
+    def save(self, levels, now):
+        cache.set_many(
+            {self.key(identity): (level, now) for identity, level in levels.items()},
+            self.timeout(min(levels.values())),
+        )
+
+    def acquire(self, identities, amount=1):
+        """Take tokens from every identity's bucket if all of them hold enough
+
+        Returns 0 when taken, otherwise the seconds until they will.
+        """
+        now = time.time()
+        levels = self.levels(identities, now)
+        shortfall = max((amount - level for level in levels.values()), default=0)
+        if shortfall > 0:
+            return shortfall / self.refill_rate
+        if amount:
+            self.save({identity: level - amount for identity, level in levels.items()}, now)
+        return 0
+
+    def debit(self, identities, amount):
+        """Take tokens after the fact, overdrawing the buckets if needed"""
+        now = time.time()
+        levels = self.levels(identities, now)
+        self.save({identity: level - amount for identity, level in levels.items()}, now)
+
+
+def get_bucket(scope):
+    """Get the bucket for a scope of CHAT_RATE_LIMITS, or None when it is disabled"""
+    limits = {**RATE_LIMITS, **getattr(settings, "CHAT_RATE_LIMITS", {})}
+    if not limits.get(scope):
+        return None
+    capacity, refill_rate = limits[scope]
+    return TokenBucket(scope, capacity, refill_rate)
+
+
+def client_ip(request):
+    """Get the client's address, trusting CHAT_RATE_LIMIT_NUM_PROXIES reverse proxies"""
+    num_proxies = getattr(settings, "CHAT_RATE_LIMIT_NUM_PROXIES", 0)
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR")
+    if num_proxies and forwarded:
+        addresses = [address.strip() for address in forwarded.split(",")]
+        return addresses[-min(num_proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def client_identities(request):
+    """Get the identities whose buckets a request counts against"""
+    identities = [f"ip:{client_ip(request)}"]
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        identities.append(f"session:{session_key}")
+    return identities
+
+
+def debit_tokens(identities, eval_count):
+    """Charge generated tokens to the clients that requested them"""
+    bucket = get_bucket("tokens")
+    if bucket and identities and eval_count:
+        bucket.debit(identities, eval_count)
+
+
+def tokens_exhausted(identities):
+    """Get the seconds until the clients' token quota is no longer overdrawn, 0 if it isn't"""
+    bucket = get_bucket("tokens")
+    if bucket is None or not identities:
+        return 0
+    return bucket.acquire(identities, 0)
+
+
+class RateLimitMiddleware:
+    """Refuse requests to the chat views with 429 once a client is over its limits
+
+    Runs before the view, so refused requests cost no database or model work.
+    The client's identities are stored on ``request.rate_limit_identities`` for
+    charging generated tokens later.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        url_name = request.resolver_match.url_name if request.resolver_match else None
+        if request.method not in RATE_LIMITED_VIEWS.get(url_name, ()):
+            return None
+
+        identities = client_identities(request)
+        request.rate_limit_identities = identities
+        # Check the token quota first so an overdrawn client keeps its request tokens
+        for scope, amount in (("tokens", 0), ("requests", 1)):
+            bucket = get_bucket(scope)
+            if bucket is None:
+                continue
+            retry_after = bucket.acquire(identities, amount)
+            if retry_after:
+                response = HttpResponse(ERROR_MESSAGES["RATE_LIMITED"], status=429)
+                response["Retry-After"] = str(math.ceil(retry_after))
+                return response
+        return None
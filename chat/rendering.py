@@ -0,0 +1,20 @@
+"""Markdown rendering for AI messages"""
+
+import markdown
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .profiling import span
+
+
+@span("markdown")
+def render_markdown(content):
+    """Convert markdown to HTML safely"""
+    md = markdown.Markdown(
+        extensions=[
+            "fenced_code",
+            "tables",
+            "nl2br",
+        ]
+    )
+    return mark_safe(md.convert(escape(content)))
@@ -0,0 +1,164 @@
+"""Retention policy: move idle conversations into compressed archive rows"""
+
+import gzip
+import json
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, OuterRef
+from django.utils import timezone
+
+from .models import Conversation, ConversationArchive, Message
+from .transfer import TransferJSONEncoder, bulk_create_preserving_timestamps, record_fields
+from .constants import ARCHIVE_CODECS, RETENTION_MAX_AGE_DAYS
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def available_codecs():
+    """Get the archive codecs usable in this environment, preferred first"""
+    return [codec for codec in ARCHIVE_CODECS if codec != "zstd" or zstandard]
+
+
+def compress(data, codec):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "gzip":
+        return gzip.compress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+def decompress(data, codec):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Reading zstd archives requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"Unknown archive codec: {codec}")
+
+
+class RetentionPolicy:
+    """Select conversations to archive by age and by total hot message count
+
+    Conversations are considered oldest first (by ``updated_at``). A
+    conversation is archived if it has been idle for more than
+    ``max_age_days``, or while the hot table still holds more than
+    ``max_messages`` messages.
+    """
+
+    def __init__(self, max_age_days=RETENTION_MAX_AGE_DAYS, max_messages=None):
+        self.max_age_days = max_age_days
+        self.max_messages = max_messages
+
+    def candidates(self):
+        """Get the ids of conversations to archive, oldest first"""
+        cutoff = None
+        if self.max_age_days is not None:
+            cutoff = timezone.now() - timedelta(days=self.max_age_days)
+        excess = 0
+        if self.max_messages is not None:
+            excess = Message.objects.count() - self.max_messages
+
+        ids = []
+        rows = (
+            Conversation.objects.annotate(num_messages=Count("messages"))
+            .order_by("updated_at")
+            .values_list("pk", "updated_at", "num_messages")
+        )
+        for pk, updated_at, num_messages in rows.iterator():
+            if (cutoff is None or updated_at >= cutoff) and excess <= 0:
+                break
+            ids.append(pk)
+            excess -= num_messages
+        return ids
+
+
+class ConcurrentMessageError(Exception):
+    """A message was added to a conversation while it was being archived"""
+
+
+def archive_conversations(conversation_ids, codec, selected_at=None):
+    """Replace conversations and their messages with archive rows
+
+    Conversations updated or given a message after ``selected_at`` (when the
+    candidates were chosen) are left in place. The rest are locked while they
+    are archived, so no message can be added to them in the meantime; on
+    databases without row locks, a message added anyway rolls the batch back.
+
+    Returns the number of conversations archived and of messages moved out of
+    the hot table.
+    """
+    selected_at = selected_at or timezone.now()
+    try:
+        with transaction.atomic():
+            conversations = list(
+                Conversation.objects.select_for_update()
+                .filter(pk__in=conversation_ids, updated_at__lte=selected_at)
+                .exclude(
+                    Exists(Message.objects.filter(conversation=OuterRef("pk"), timestamp__gt=selected_at))
+                )
+                .values(*record_fields(Conversation))
+            )
+            archived_ids = [values["id"] for values in conversations]
+            messages = defaultdict(list)
+            rows = (
+                Message.objects.filter(conversation_id__in=archived_ids)
+                .order_by("timestamp", "pk")
+                .values(*record_fields(Message))
+            )
+            for values in rows:
+                messages[values["conversation_id"]].append(values)
+
+            archives = []
+            for values in conversations:
+                payload = json.dumps(
+                    {"conversation": values, "messages": messages[values["id"]]},
+                    cls=TransferJSONEncoder,
+                )
+                archives.append(
+                    ConversationArchive(
+                        original_id=values["id"],
+                        title=values["title"],
+                        message_count=len(messages[values["id"]]),
+                        codec=codec,
+                        payload=compress(payload.encode(), codec),
+                        created_at=values["created_at"],
+                        updated_at=values["updated_at"],
+                    )
+                )
+            ConversationArchive.objects.bulk_create(archives)
+            Message.objects.filter(
+                pk__in=[values["id"] for batch in messages.values() for values in batch]
+            ).delete()
+            if Message.objects.filter(conversation_id__in=archived_ids).exists():
+                raise ConcurrentMessageError
+            Conversation.objects.filter(pk__in=archived_ids).delete()
+    except ConcurrentMessageError:
+        return 0, 0
+    return len(archives), sum(archive.message_count for archive in archives)
+
+
+def rehydrate_conversation(conversation_id):
+    """Restore an archived conversation into the hot tables
+
+    Returns the restored conversation, or None if there is no archive for it.
+    """
+    archive = ConversationArchive.objects.filter(original_id=conversation_id).first()
+    if archive is None:
+        return None
+
+    data = json.loads(decompress(bytes(archive.payload), archive.codec))
+    try:
+        with transaction.atomic():
+            bulk_create_preserving_timestamps(Conversation, [data["conversation"]])
+            bulk_create_preserving_timestamps(Message, data["messages"])
+            archive.delete()
+    except IntegrityError:
+        # Another request restored it first
+        pass
+    return Conversation.objects.get(pk=conversation_id)
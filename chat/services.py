@@ -1,90 +1,99 @@
 """Service layer for business logic"""
 
-import httpx
+import hashlib
 import json
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection
 from django.utils import timezone
 
-from .models import Conversation, Message
+from .models import Conversation, Message, MessageEmbedding
 from .constants import (
-    OLLAMA_CHAT_ENDPOINT,
-    OLLAMA_MODEL,
-    OLLAMA_TIMEOUT,
-    OLLAMA_STREAM_TIMEOUT,
     CONVERSATION_CONTEXT_LIMIT,
     ERROR_MESSAGES,
+    GENERATION_CLAIM_TIMEOUT,
+    CANCEL_CHECK_INTERVAL,
+    PREFETCH_KEEP_ALIVE,
+    PREFETCH_WARM_TTL,
+    PREFETCH_MIN_INTERVAL,
+    EMBEDDING_MODEL,
+    EMBEDDING_WAIT_TIMEOUT,
+    RETRIEVAL_TOP_K,
 )
-from .exceptions import OllamaConnectionError, OllamaResponseError
+from .backends import get_backend
+from .pipeline import get_pipeline
+from .ratelimit import debit_tokens
+from .profiling import in_request_context, record_span, span
+from .pubsub import channel_for_message, get_token_bus, is_terminal
+
+logger = logging.getLogger(__name__)
+
+
+def format_timestamp(timestamp):
+    """Format a timestamp in local time to match the template's g:i A format"""
+    local_time = timestamp.astimezone()
+    return local_time.strftime('%I:%M %p').lstrip('0').replace(' 0', ' ')
 
 
 class OllamaService:
     """Service for interacting with Ollama API"""
     
     @staticmethod
-    def format_messages(conversation, limit=CONVERSATION_CONTEXT_LIMIT):
-        """Format conversation messages for Ollama API"""
+    def format_messages(conversation, limit=CONVERSATION_CONTEXT_LIMIT, query=None):
+        """Format conversation messages for Ollama API
+
+        With retrieval enabled and a query message, earlier messages related
+        to the query are placed before the recent ones.
+        """
         messages = conversation.get_context_messages(limit)
+        if query is not None and len(messages) == limit and EmbeddingService.enabled():
+            exclude_ids = [msg.id for msg in messages]
+            with span("retrieval"):
+                messages = EmbeddingService.related_messages(query, exclude_ids) + messages
         return [
             {"role": msg.role, "content": msg.content}
             for msg in messages
         ]
     
     @staticmethod
-    async def get_completion(messages):
-        """Get a completion from Ollama (non-streaming)"""
-        async with httpx.AsyncClient(timeout=OLLAMA_TIMEOUT) as client:
-            try:
-                response = await client.post(
-                    OLLAMA_CHAT_ENDPOINT,
-                    json={
-                        "model": OLLAMA_MODEL,
-                        "messages": messages,
-                        "stream": False,
-                    },
-                )
-                
-                if response.status_code != 200:
-                    raise OllamaResponseError(ERROR_MESSAGES["OLLAMA_ERROR"])
-                
-                data = response.json()
-                return data.get("message", {}).get("content", "")
-                
-            except httpx.ConnectError as e:
-                raise OllamaConnectionError(f"{ERROR_MESSAGES['OLLAMA_CONNECTION']}: {str(e)}")
-            except httpx.TimeoutException:
-                raise OllamaConnectionError("Request to Ollama timed out")
-            except Exception as e:
-                raise OllamaResponseError(f"Unexpected error: {str(e)}")
+    async def get_completion(messages, backend=None, model=None, options=None, usage=None):
+        """Get a completion from the model backend (non-streaming)
+
+        ``usage`` receives the number of generated tokens as ``eval_count``.
+        """
+        with span("model.chat"):
+            return await get_backend(backend).chat(messages, model, options, usage)
     
     @staticmethod
-    def stream_completion(messages):
-        """Stream a completion from Ollama"""
+    def warm_cache(messages, backend=None, model=None, options=None):
+        """Have the backend evaluate a prompt without generating, so its KV cache is warm
+
+        Returns False when the backend can't.
+        """
+        with span("model.warm"):
+            return get_backend(backend).warm(
+                messages, model, options, keep_alive=PREFETCH_KEEP_ALIVE
+            )
+
+    @staticmethod
+    def stream_completion(messages, backend=None, model=None, options=None):
+        """Stream a completion from the model backend"""
         
         def generate():
             full_response = ""
+            usage = {}
             
             try:
-                with httpx.Client(timeout=OLLAMA_STREAM_TIMEOUT) as client:
-                    with client.stream(
-                        "POST",
-                        OLLAMA_CHAT_ENDPOINT,
-                        json={
-                            "model": OLLAMA_MODEL,
-                            "messages": messages,
-                            "stream": True,
-                        },
-                    ) as response:
-                        for line in response.iter_lines():
-                            if line:
-                                try:
-                                    data = json.loads(line)
-                                    if "message" in data and "content" in data["message"]:
-                                        token = data["message"]["content"]
-                                        full_response += token
-                                        yield json.dumps({'type': 'token', 'content': token})
-                                except json.JSONDecodeError:
-                                    continue
-                                except Exception as e:
-                                    yield json.dumps({'type': 'error', 'content': f'Parse error: {str(e)}'})
+                with span("model.stream"):
+                    started = time.perf_counter()
+                    for token in get_backend(backend).stream(messages, model, options, usage):
+                        if not full_response:
+                            record_span("model.first_token", started)
+                        full_response += token
+                        yield json.dumps({'type': 'token', 'content': token})
             except Exception as e:
                 yield json.dumps({'type': 'error', 'content': f'Connection error: {str(e)}'})
                 return
@@ -93,7 +102,8 @@ class OllamaService:
             if full_response:
                 yield json.dumps({
                     'type': 'complete',
-                    'content': full_response
+                    'content': full_response,
+                    'eval_count': usage.get('eval_count'),
                 })
             else:
                 yield json.dumps({'type': 'error', 'content': ERROR_MESSAGES['NO_RESPONSE']})
@@ -105,32 +115,307 @@ class ConversationService:
     """Service for managing conversations"""
     
     @staticmethod
+    @span("conversation.create")
     def create_conversation(initial_message):
         """Create a new conversation with an initial message"""
-        return Conversation.objects.create_with_message(initial_message)
+        conversation = Conversation.objects.create_with_message(initial_message)
+        get_pipeline().schedule(conversation.messages.get())
+        return conversation
     
     @staticmethod
+    @span("conversation.add_message")
     def add_user_message(conversation, content):
         """Add a user message to a conversation"""
-        return Message.objects.create(
+        message = Message.objects.create(
             conversation=conversation,
             content=content,
             is_user=True
         )
+        get_pipeline().schedule(message)
+        return message
     
     @staticmethod
-    def add_ai_message(conversation, content):
-        """Add an AI message to a conversation"""
+    @span("conversation.add_message")
+    def add_ai_message(conversation, content, is_truncated=False, token_count=None):
+        """Add an AI message to a conversation and queue its post-turn processing"""
         message = Message.objects.create(
             conversation=conversation,
             content=content,
-            is_user=False
+            is_user=False,
+            is_truncated=is_truncated,
+            token_count=token_count,
         )
         # Update conversation's updated_at
         conversation.save()
+        get_pipeline().schedule(message)
         return message
     
     @staticmethod
     def get_recent_conversations(limit=5):
         """Get recent conversations"""
-        return Conversation.objects.recent(limit)
\ No newline at end of file
+        return Conversation.objects.recent(limit)
+
+
+class GenerationService:
+    """Service for running generations outside the request that streams them"""
+
+    @staticmethod
+    def start(conversation, user_message, client_identities=()):
+        """Start generating the response to a user message, unless already started
+
+        The generated tokens are charged to the client identities' token quota.
+        Returns the token bus channel the generation publishes to.
+        """
+        channel = channel_for_message(user_message.id)
+        if cache.add(f"{channel}:claimed", True, GENERATION_CLAIM_TIMEOUT):
+            threading.Thread(
+                target=in_request_context(GenerationService.run),
+                args=(conversation, user_message, channel, client_identities),
+                daemon=True,
+            ).start()
+        return channel
+
+    @staticmethod
+    def run(conversation, user_message, channel, client_identities=()):
+        """Stream a completion from Ollama and publish its events to a channel
+
+        The context, including any retrieved messages, is built here rather
+        than in the request. Stops early, keeping the partial response, once
+        the generation is cancelled.
+        """
+        bus = get_token_bus()
+        tokens = []
+        try:
+            messages = OllamaService.format_messages(conversation, query=user_message)
+            generation_settings = conversation.generation_settings()
+            warm = PrefetchService.consume_warm(conversation.id, messages, generation_settings)
+            started = last_check = time.monotonic()
+            stream = OllamaService.stream_completion(messages, **generation_settings)()
+            for chunk in stream:
+                # Checked before each chunk, so a cancel can't act on a finished generation
+                if time.monotonic() - last_check >= CANCEL_CHECK_INTERVAL:
+                    last_check = time.monotonic()
+                    if GenerationService.is_cancelled(channel):
+                        # Closing the generator closes the HTTP stream to Ollama
+                        stream.close()
+                        # Streamed chunks approximate tokens when no eval_count arrives
+                        debit_tokens(client_identities, len(tokens))
+                        if tokens:
+                            event = GenerationService.finish(
+                                conversation, "".join(tokens), is_truncated=True
+                            )
+                        else:
+                            event = {'type': 'error', 'content': ERROR_MESSAGES['GENERATION_STOPPED']}
+                        bus.publish(channel, event)
+                        break
+
+                event = json.loads(chunk)
+                if event["type"] == "token":
+                    if not tokens:
+                        PrefetchService.record_ttft(time.monotonic() - started, warm)
+                    tokens.append(event["content"])
+                elif event["type"] == "complete":
+                    debit_tokens(client_identities, event.get("eval_count") or len(tokens))
+                    event = GenerationService.finish(
+                        conversation, event["content"], token_count=event.get("eval_count")
+                    )
+                bus.publish(channel, event)
+                if is_terminal(event):
+                    break
+        except Exception as e:
+            bus.publish(channel, {'type': 'error', 'content': f'Generation error: {str(e)}'})
+        finally:
+            connection.close()
+
+    @staticmethod
+    def finish(conversation, content, is_truncated=False, token_count=None):
+        """Save the AI message and build the event that ends the channel"""
+        ai_message = ConversationService.add_ai_message(
+            conversation, content, is_truncated=is_truncated, token_count=token_count
+        )
+        return {
+            "type": "done",
+            "timestamp": format_timestamp(ai_message.timestamp),
+            "truncated": is_truncated,
+        }
+
+    @staticmethod
+    def cancel(channel):
+        """Ask a running generation to stop"""
+        cache.set(f"{channel}:cancelled", True, GENERATION_CLAIM_TIMEOUT)
+
+    @staticmethod
+    def is_cancelled(channel):
+        return cache.get(f"{channel}:cancelled", False)
+
+    @staticmethod
+    def add_subscriber(channel):
+        """Record that a client is streaming a channel"""
+        key = f"{channel}:subscribers"
+        cache.add(key, 0, GENERATION_CLAIM_TIMEOUT)
+        cache.incr(key)
+
+    @staticmethod
+    def remove_subscriber(channel):
+        """Record that a client went away, cancelling the generation if it was the last"""
+        try:
+            remaining = cache.decr(f"{channel}:subscribers")
+        except ValueError:
+            remaining = 0
+        if remaining <= 0:
+            GenerationService.cancel(channel)
+
+
+class PrefetchService:
+    """Service for warming Ollama's cache with a conversation while the user types"""
+
+    @staticmethod
+    def key(conversation_id):
+        return f"chat:prefetch:{conversation_id}"
+
+    @staticmethod
+    def digest(messages, generation_settings):
+        return hashlib.sha1(json.dumps([messages, generation_settings]).encode()).hexdigest()
+
+    @staticmethod
+    def prefetch(conversation):
+        """Warm the cache for a conversation's history in the background
+
+        The warmed messages are the ones the next generation will send before
+        the new user message: the last CONVERSATION_CONTEXT_LIMIT - 1.
+        Returns False when skipped: rate-limited, or that history is already warm.
+        """
+        key = PrefetchService.key(conversation.id)
+        if not cache.add(f"{key}:throttle", True, PREFETCH_MIN_INTERVAL):
+            return False
+        messages = OllamaService.format_messages(conversation, limit=CONVERSATION_CONTEXT_LIMIT - 1)
+        generation_settings = conversation.generation_settings()
+        digest = PrefetchService.digest(messages, generation_settings)
+        if cache.get(f"{key}:digest") == digest:
+            return False
+        cache.set(f"{key}:digest", digest, PREFETCH_WARM_TTL)
+        threading.Thread(
+            target=PrefetchService.run,
+            args=(key, messages, generation_settings),
+            daemon=True,
+        ).start()
+        return True
+
+    @staticmethod
+    def run(key, messages, generation_settings):
+        try:
+            warmed = OllamaService.warm_cache(messages, **generation_settings)
+        except Exception as e:
+            cache.delete(f"{key}:digest")
+            logger.warning("Prompt prefetch failed: %s", e)
+            return
+        # The digest stays, so an unsupported backend isn't asked again for this prompt
+        if warmed:
+            cache.set(f"{key}:warm", PrefetchService.digest(messages, generation_settings), PREFETCH_WARM_TTL)
+
+    @staticmethod
+    def consume_warm(conversation_id, messages, generation_settings):
+        """Whether a prefetch since the conversation's last generation warmed this prompt
+
+        Only counts when everything before the new user message is exactly
+        what was warmed, since otherwise the server can't reuse its cache.
+        """
+        key = f"{PrefetchService.key(conversation_id)}:warm"
+        warmed = cache.get(key)
+        if warmed:
+            cache.delete(key)
+        return warmed == PrefetchService.digest(messages[:-1], generation_settings)
+
+    @staticmethod
+    def record_ttft(seconds, warm):
+        """Add a time-to-first-token sample to the shared warm/cold totals"""
+        prefix = f"chat:ttft:{'warm' if warm else 'cold'}"
+        cache.add(f"{prefix}:count", 0, None)
+        cache.add(f"{prefix}:total_ms", 0, None)
+        cache.incr(f"{prefix}:count")
+        cache.incr(f"{prefix}:total_ms", round(seconds * 1000))
+        logger.info("Time to first token: %.0f ms (%s)", seconds * 1000, "warm" if warm else "cold")
+
+    @staticmethod
+    def ttft_report():
+        """Get average time to first token with and without a warm prefetch"""
+        report = {}
+        for state in ("warm", "cold"):
+            count = cache.get(f"chat:ttft:{state}:count", 0)
+            total = cache.get(f"chat:ttft:{state}:total_ms", 0)
+            report[state] = {"count": count, "avg_ms": round(total / count) if count else None}
+        if report["warm"]["avg_ms"] is not None and report["cold"]["avg_ms"] is not None:
+            report["improvement_ms"] = report["cold"]["avg_ms"] - report["warm"]["avg_ms"]
+        return report
+
+
+class EmbeddingService:
+    """Service for embedding messages and retrieving related earlier ones"""
+
+    @staticmethod
+    def enabled():
+        return getattr(settings, "CHAT_RETRIEVAL_ENABLED", False)
+
+    @staticmethod
+    def model():
+        return getattr(settings, "CHAT_EMBEDDING_MODEL", EMBEDDING_MODEL)
+
+    @staticmethod
+    def embed(message):
+        """Get a message's embedding, computing and storing it if needed
+
+        One thread computes it; others asking meanwhile, such as the pipeline
+        and a generation retrieving for the same message, wait for its result.
+        """
+        claim = f"chat:embedding:{message.id}:claimed"
+        deadline = time.monotonic() + EMBEDDING_WAIT_TIMEOUT
+        while True:
+            existing = MessageEmbedding.objects.filter(message=message).first()
+            if existing:
+                return existing.unpack()
+            if cache.add(claim, True, EMBEDDING_WAIT_TIMEOUT) or time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+
+        try:
+            vector = get_backend(message.conversation.backend or None).embeddings(
+                message.content, EmbeddingService.model()
+            )
+            try:
+                MessageEmbedding.objects.create(
+                    message=message,
+                    model=EmbeddingService.model(),
+                    vector=MessageEmbedding.pack(vector),
+                )
+            except IntegrityError:
+                # Embedded concurrently
+                pass
+            return vector
+        finally:
+            cache.delete(claim)
+
+    @staticmethod
+    def related_messages(query, exclude_ids=(), k=RETRIEVAL_TOP_K):
+        """Get up to k earlier messages in the query's conversation most similar to it
+
+        Only that conversation's embeddings are loaded and scored.
+        """
+        from .vector_index import top_k, unpack_vectors
+
+        try:
+            vector = EmbeddingService.embed(query)
+            rows = list(
+                MessageEmbedding.objects.filter(
+                    message__conversation_id=query.conversation_id, model=EmbeddingService.model()
+                )
+                .exclude(message_id__in=[query.id, *exclude_ids])
+                .values_list("message_id", "vector")
+            )
+            matches = []
+            if rows:
+                ids, packed = zip(*rows)
+                matches = top_k(vector, ids, unpack_vectors(packed), k)
+        except Exception as e:
+            logger.warning("Retrieval for message %s failed: %s", query.id, e)
+            return []
+        return list(Message.objects.filter(id__in=[id for id, _ in matches]).order_by("timestamp"))
@@ -0,0 +1,24 @@
+from functools import lru_cache
+
+from django import template
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.templatetags.static import static
+
+from chat.constants import VENDOR_ASSETS
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def is_vendored(path):
+    """Whether a vendored asset is in a static directory or was collected"""
+    return bool(finders.find(path)) or staticfiles_storage.exists(path)
+
+
+@register.simple_tag
+def vendor_static(path):
+    """URL of a third-party asset: self-hosted once vendored, its pinned CDN URL until then"""
+    if is_vendored(path):
+        return static(path)
+    return VENDOR_ASSETS[path]
@@ -0,0 +1,154 @@
+"""Stand-ins for model servers used by the tests"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import override_settings
+
+from chat import backends
+from chat.backends import ChatBackend
+
+
+class ScriptedBackend(ChatBackend):
+    """In-memory backend streaming ``tokens``, then calling ``before_done`` and finishing
+
+    Embeddings come from ``vectors``, keyed by text.
+
+    ``before_done`` runs where a server would still be sending its final line,
+    so tests can make things happen while the generation is ending.
+    """
+
+    tokens = ["Hello", " there"]
+    response = "Hello there"
+    eval_count = 2
+    before_done = None
+    vectors = {}  # text -> embedding
+
+    def __init__(self, base_url="stub://", model="stub", **kwargs):
+        super().__init__(base_url, model, **kwargs)
+        self.requests = []
+        self.embedded = []
+
+    async def chat(self, messages, model=None, options=None, usage=None):
+        self.requests.append(messages)
+        if usage is not None:
+            usage["eval_count"] = self.eval_count
+        return self.response
+
+    def embeddings(self, text, model=None):
+        self.embedded.append(text)
+        return self.vectors.get(text, [0.0, 0.0, 1.0])
+
+    def stream(self, messages, model=None, options=None, usage=None):
+        self.requests.append(messages)
+        for token in self.tokens:
+            yield token
+        if self.before_done:
+            self.before_done()
+        if usage is not None:
+            usage["eval_count"] = self.eval_count
+
+
+@contextmanager
+def use_backend(backend_class, **params):
+    """Make the default backend an instance of backend_class, and yield that instance"""
+    config = {"BACKEND": f"{backend_class.__module__}.{backend_class.__qualname__}", **params}
+    with override_settings(CHAT_BACKENDS={"ollama": config}):
+        backends._backends.clear()
+        try:
+            yield backends.get_backend()
+        finally:
+            backends._backends.clear()
+
+
+def wait_for(condition, timeout=5):
+    """Poll until condition() is true, failing after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for condition")
+        time.sleep(0.01)
+
+
+class StubModelServer:
+    """Local HTTP server answering like Ollama or an OpenAI-compatible server
+
+    ``flavor`` is "ollama" or "openai". Responses stream ``tokens`` and
+    report ``eval_count`` generated tokens; ``status`` overrides the HTTP
+    status of every response. Received requests are kept in ``requests`` as
+    (path, headers, decoded JSON body).
+    """
+
+    def __init__(self, flavor, tokens=("Hello", " there"), eval_count=2, embedding=(0.5, -0.5)):
+        self.flavor = flavor
+        self.tokens = list(tokens)
+        self.eval_count = eval_count
+        self.embedding = list(embedding)
+        self.status = 200
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((self.path, dict(self.headers), body))
+                if stub.status != 200:
+                    self.send_response(stub.status)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.end_headers()
+                for chunk in getattr(stub, stub.flavor)(self.path, body):
+                    self.wfile.write(chunk.encode())
+                    self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}" + ("/v1" if self.flavor == "openai" else "")
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def ollama(self, path, body):
+        if path == "/api/embeddings":
+            yield json.dumps({"embedding": self.embedding})
+        elif not body.get("stream"):
+            yield json.dumps({
+                "message": {"role": "assistant", "content": "".join(self.tokens)},
+                "done": True,
+                "eval_count": self.eval_count,
+            })
+        else:
+            for token in self.tokens:
+                yield json.dumps({"message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            yield json.dumps({"message": {"role": "assistant", "content": ""}, "done": True,
+                              "eval_count": self.eval_count}) + "\n"
+
+    def openai(self, path, body):
+        usage = {"prompt_tokens": 3, "completion_tokens": self.eval_count}
+        if path == "/v1/embeddings":
+            yield json.dumps({"data": [{"embedding": self.embedding}]})
+        elif not body.get("stream"):
+            yield json.dumps({
+                "choices": [{"message": {"role": "assistant", "content": "".join(self.tokens)}}],
+                "usage": usage,
+            })
+        else:
+            for token in self.tokens:
+                yield "data: " + json.dumps({"choices": [{"delta": {"content": token}}]}) + "\n\n"
+            yield "data: " + json.dumps({"choices": [], "usage": usage}) + "\n\n"
+            yield "data: [DONE]\n\n"
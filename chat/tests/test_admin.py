@@ -0,0 +1,109 @@
+from unittest import mock, skipUnless
+
+from django.contrib.admin.sites import site
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from chat.admin import EstimatedCountPaginator
+from chat.models import Conversation, Message
+
+
+class MessageAdminTests(SimpleTestCase):
+    def test_does_not_search_compressed_content(self):
+        # icontains cannot match bodies stored compressed
+        self.assertNotIn("content", site._registry[Message].search_fields)
+
+
+# Renders without collectstatic's manifest
+@override_settings(
+    STORAGES={
+        "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+)
+class ChangelistTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+    def create_conversation(self, replies):
+        conversation = Conversation.objects.create_with_message("Hello")
+        for _ in range(replies):
+            Message.objects.create(conversation=conversation, content="Hi!", is_user=False)
+        return conversation
+
+    def changelist(self, model, **params):
+        url = reverse(f"admin:chat_{model._meta.model_name}_changelist")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"], len(queries)
+
+    def test_conversations_show_their_message_counts(self):
+        counts = {self.create_conversation(replies).pk: replies + 1 for replies in (0, 2, 4)}
+
+        cl, _ = self.changelist(Conversation)
+
+        self.assertEqual({row.pk: row.num_messages for row in cl.result_list}, counts)
+
+    def test_conversation_changelist_queries_do_not_grow_with_rows(self):
+        self.create_conversation(1)
+        _, one_row = self.changelist(Conversation)
+        for replies in range(5):
+            self.create_conversation(replies)
+
+        _, six_rows = self.changelist(Conversation)
+
+        self.assertEqual(six_rows, one_row)
+
+    def test_message_changelist_queries_do_not_grow_with_rows(self):
+        self.create_conversation(0)
+        _, one_row = self.changelist(Message)
+        for replies in range(5):
+            self.create_conversation(replies)
+
+        _, many_rows = self.changelist(Message)
+
+        self.assertEqual(many_rows, one_row)
+
+    def test_filters_messages_by_conversation_id(self):
+        conversation = self.create_conversation(2)
+        self.create_conversation(3)
+
+        cl, _ = self.changelist(Message, conversation_id=conversation.pk)
+
+        self.assertEqual(
+            sorted(message.pk for message in cl.result_list),
+            sorted(conversation.messages.values_list("pk", flat=True)),
+        )
+
+    def test_invalid_conversation_id_matches_nothing(self):
+        self.create_conversation(1)
+
+        cl, _ = self.changelist(Message, conversation_id="abc")
+
+        self.assertEqual(list(cl.result_list), [])
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        conversation = Conversation.objects.create_with_message("Hello")
+        Message.objects.create(conversation=conversation, content="Hi!", is_user=False)
+
+    def test_filtered_queryset_is_counted_exactly(self):
+        with mock.patch("chat.admin.ESTIMATED_COUNT_THRESHOLD", 0):
+            paginator = EstimatedCountPaginator(Message.objects.filter(is_user=False), 50)
+            self.assertEqual(paginator.count, 1)
+
+    @skipUnless(connection.vendor == "postgresql", "set POSTGRES_DB to run against PostgreSQL")
+    def test_large_table_is_counted_from_statistics(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE "{Message._meta.db_table}"')
+
+        with mock.patch("chat.admin.ESTIMATED_COUNT_THRESHOLD", 0), CaptureQueriesContext(connection) as queries:
+            count = EstimatedCountPaginator(Message.objects.all(), 50).count
+
+        self.assertEqual(count, 2)
+        self.assertNotIn("COUNT(", queries[0]["sql"])
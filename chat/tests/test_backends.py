@@ -0,0 +1,142 @@
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from chat import backends
+from chat.backends import OllamaBackend, OpenAICompatibleBackend, get_backend
+from chat.exceptions import BackendConnectionError, BackendResponseError, OllamaResponseError
+
+from .stubs import StubModelServer
+
+MESSAGES = [{"role": "user", "content": "Hi"}]
+
+
+class OllamaBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.server = self.enterContext(StubModelServer("ollama"))
+        self.backend = OllamaBackend(self.server.url, "gemma3:4b", keep_alive="5m")
+
+    def test_chat(self):
+        usage = {}
+
+        response = async_to_sync(self.backend.chat)(MESSAGES, options={"temperature": 0.2}, usage=usage)
+
+        self.assertEqual(response, "Hello there")
+        self.assertEqual(usage, {"eval_count": 2})
+        path, _, body = self.server.requests[0]
+        self.assertEqual(path, "/api/chat")
+        self.assertEqual(
+            body,
+            {"model": "gemma3:4b", "messages": MESSAGES, "stream": False,
+             "options": {"temperature": 0.2}, "keep_alive": "5m"},
+        )
+
+    def test_stream_reports_usage(self):
+        usage = {}
+
+        tokens = list(self.backend.stream(MESSAGES, model="other", usage=usage))
+
+        self.assertEqual(tokens, ["Hello", " there"])
+        self.assertEqual(usage, {"eval_count": 2})
+        self.assertEqual(self.server.requests[0][2]["model"], "other")
+
+    def test_embeddings(self):
+        self.assertEqual(self.backend.embeddings("Hi", "nomic-embed-text"), [0.5, -0.5])
+        self.assertEqual(
+            self.server.requests[0][2], {"model": "nomic-embed-text", "prompt": "Hi"}
+        )
+
+    def test_warm_generates_nothing(self):
+        self.assertTrue(self.backend.warm(MESSAGES, options={"num_ctx": 4096}, keep_alive="10m"))
+
+        body = self.server.requests[0][2]
+        self.assertEqual(body["options"], {"num_ctx": 4096, "num_predict": 0})
+        self.assertEqual(body["keep_alive"], "10m")
+
+    def test_error_status_raises_response_error(self):
+        self.server.status = 500
+
+        with self.assertRaises(OllamaResponseError):
+            async_to_sync(self.backend.chat)(MESSAGES)
+
+
+class OpenAICompatibleBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.server = self.enterContext(StubModelServer("openai"))
+        self.backend = OpenAICompatibleBackend(self.server.url, "llama", api_key="secret")
+
+    def test_chat_translates_options(self):
+        usage = {}
+
+        response = async_to_sync(self.backend.chat)(
+            MESSAGES, options={"num_predict": 16, "temperature": 0.5, "num_ctx": 4096}, usage=usage
+        )
+
+        self.assertEqual(response, "Hello there")
+        self.assertEqual(usage, {"eval_count": 2})
+        path, headers, body = self.server.requests[0]
+        self.assertEqual(path, "/v1/chat/completions")
+        self.assertEqual(headers["Authorization"], "Bearer secret")
+        self.assertEqual(
+            body,
+            {"model": "llama", "messages": MESSAGES, "stream": False,
+             "max_tokens": 16, "temperature": 0.5},
+        )
+
+    def test_stream_reports_usage(self):
+        usage = {}
+
+        tokens = list(self.backend.stream(MESSAGES, usage=usage))
+
+        self.assertEqual(tokens, ["Hello", " there"])
+        self.assertEqual(usage, {"eval_count": 2})
+        self.assertEqual(self.server.requests[0][2]["stream_options"], {"include_usage": True})
+
+    def test_embeddings(self):
+        self.assertEqual(self.backend.embeddings("Hi"), [0.5, -0.5])
+        self.assertEqual(self.server.requests[0][0], "/v1/embeddings")
+
+    def test_warm_is_not_supported(self):
+        self.assertFalse(self.backend.warm(MESSAGES))
+        self.assertEqual(self.server.requests, [])
+
+    def test_error_status_raises_response_error(self):
+        self.server.status = 503
+
+        with self.assertRaises(BackendResponseError):
+            list(self.backend.stream(MESSAGES))
+
+
+class BackendConfigurationTests(SimpleTestCase):
+    def setUp(self):
+        backends._backends.clear()
+        self.addCleanup(backends._backends.clear)
+
+    def test_unreachable_server_raises_connection_error(self):
+        backend = OllamaBackend("http://127.0.0.1:9", "gemma3:4b")
+
+        with self.assertRaises(BackendConnectionError):
+            list(backend.stream(MESSAGES))
+
+    @override_settings(CHAT_BACKENDS={
+        "local": {"BACKEND": "chat.backends.OllamaBackend", "BASE_URL": "http://localhost:11434/",
+                  "MODEL": "gemma3:4b", "TIMEOUT": 5},
+    })
+    def test_get_backend_passes_parameters(self):
+        backend = get_backend("local")
+
+        self.assertIsInstance(backend, OllamaBackend)
+        self.assertEqual((backend.base_url, backend.timeout), ("http://localhost:11434", 5))
+        self.assertIs(get_backend("local"), backend)
+
+    @override_settings(CHAT_BACKENDS={
+        "local": {"BACKEND": "chat.backends.OllamaBackend", "BASE_URL": "http://localhost:11434",
+                  "MODEL": "gemma3:4b", "TIMOUT": 5},
+    })
+    def test_unknown_parameter_is_rejected(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, "Unknown OllamaBackend parameters: TIMOUT"):
+            get_backend("local")
+
+    def test_unknown_alias_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_backend("missing")
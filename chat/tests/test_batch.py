@@ -0,0 +1,96 @@
+import asyncio
+import io
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+
+from chat.batch import BatchRunner, parse_prompt
+from chat.models import Conversation, Message
+
+from .stubs import ScriptedBackend, use_backend
+
+
+class BulkCreateExchangesTests(TestCase):
+    def test_creates_a_conversation_per_exchange(self):
+        conversations = Conversation.objects.bulk_create_exchanges(
+            [("Hi", "Hello!"), ("2 + 2?", "4")], backend="ollama", model="gemma3:4b"
+        )
+
+        self.assertEqual(len(conversations), 2)
+        self.assertEqual(
+            list(conversations[1].messages.values_list("content", "is_user")),
+            [("2 + 2?", True), ("4", False)],
+        )
+        self.assertEqual(conversations[0].model, "gemma3:4b")
+
+    def test_failed_message_insert_leaves_no_conversations(self):
+        with mock.patch.object(Message.objects, "bulk_create", side_effect=DatabaseError("disk full")):
+            with self.assertRaises(DatabaseError):
+                Conversation.objects.bulk_create_exchanges([("Hi", "Hello!")])
+
+        self.assertFalse(Conversation.objects.exists())
+
+
+class MalformedResponseBackend(ScriptedBackend):
+    """Backend whose server answers "bad" prompts without a message"""
+
+    async def chat(self, messages, model=None, options=None, usage=None):
+        if messages[-1]["content"] == "bad":
+            raise KeyError("message")
+        return await super().chat(messages, model, options, usage)
+
+
+class BatchRunnerTests(SimpleTestCase):
+    def run_batch(self, prompts, **options):
+        results = []
+        runner = BatchRunner(backoff=0, **options)
+        report = async_to_sync(runner.run)(
+            [parse_prompt(prompt, index) for index, prompt in enumerate(prompts)],
+            on_result=results.append,
+        )
+        return sorted(results, key=lambda result: result["id"]), report
+
+    def test_unexpected_error_fails_only_its_prompt(self):
+        with use_backend(MalformedResponseBackend), self.assertLogs("chat.batch", "ERROR"):
+            results, report = self.run_batch(["Hi", "bad", "Hi"])
+
+        self.assertEqual([result["response"] for result in results], ["Hello there", None, "Hello there"])
+        self.assertEqual(results[1]["error"], "KeyError: 'message'")
+        self.assertEqual(results[1]["attempts"], 1)
+        self.assertEqual((report.succeeded, report.failed), (2, 1))
+
+    def test_unknown_backend_fails_before_reading_prompts(self):
+        read = []
+
+        def prompts():
+            read.append(True)
+            yield {"id": 0, "prompt": "Hi"}
+
+        with self.assertRaises(ImproperlyConfigured):
+            async_to_sync(BatchRunner(backend="nope").run)(prompts())
+        self.assertEqual(read, [])
+
+    async def test_failing_worker_does_not_block_the_producer(self):
+        def on_result(result):
+            raise RuntimeError("output closed")
+
+        prompts = [{"id": index, "prompt": "Hi"} for index in range(30)]
+        with use_backend(ScriptedBackend):
+            with self.assertRaisesMessage(RuntimeError, "output closed"):
+                await asyncio.wait_for(BatchRunner(concurrency=2).run(prompts, on_result), 5)
+
+
+class BatchCompleteCommandTests(SimpleTestCase):
+    def test_unknown_backend_is_reported(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as source:
+            source.write('"Hi"\n')
+            source.flush()
+            output = io.StringIO()
+            with self.assertRaisesMessage(CommandError, "No chat backend named 'nope'"):
+                call_command("batch_complete", source.name, backend="nope", stdout=output)
+        self.assertEqual(output.getvalue(), "")
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from chat.models import Conversation
+from chat.pubsub import InProcessTokenBus, channel_for_message
+from chat.services import GenerationService
+
+from .stubs import ScriptedBackend, use_backend
+
+
+class GenerationRunTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.conversation = Conversation.objects.create_with_message("Hi")
+        self.user_message = self.conversation.messages.get()
+        self.channel = channel_for_message(self.user_message.pk)
+        self.bus = InProcessTokenBus()
+        mock.patch("chat.services.get_token_bus", lambda: self.bus).start()
+        mock.patch("chat.services.get_pipeline").start()
+        mock.patch("chat.services.CANCEL_CHECK_INTERVAL", 0).start()
+        self.debit = mock.patch("chat.services.debit_tokens").start()
+        self.addCleanup(mock.patch.stopall)
+
+    def run_generation(self):
+        GenerationService.run(self.conversation, self.user_message, self.channel, ["ip:127.0.0.1"])
+
+    def ai_messages(self):
+        return list(
+            self.conversation.messages.filter(is_user=False).values_list("content", "is_truncated")
+        )
+
+    def done_events(self):
+        return [event for event in self.bus._events(self.channel) if event["type"] == "done"]
+
+    def test_completes_and_publishes_done_once(self):
+        with use_backend(ScriptedBackend):
+            self.run_generation()
+
+        self.assertEqual(self.ai_messages(), [("Hello there", False)])
+        self.assertEqual(len(self.done_events()), 1)
+        self.debit.assert_called_once_with(["ip:127.0.0.1"], 2)
+
+    def test_cancel_arriving_with_completion_finishes_once(self):
+        with use_backend(ScriptedBackend) as backend:
+            backend.before_done = lambda: GenerationService.cancel(self.channel)
+            self.run_generation()
+
+        self.assertEqual(len(self.ai_messages()), 1)
+        self.assertEqual(len(self.done_events()), 1)
+        self.debit.assert_called_once()
+
+    def test_cancel_keeps_partial_response(self):
+        with use_backend(ScriptedBackend) as backend:
+            backend.tokens = ["Hello", " there", " and", " more"]
+            backend.stream = self.cancel_after_first_token(backend.stream)
+            self.run_generation()
+
+        self.assertEqual(self.ai_messages(), [("Hello", True)])
+        self.assertEqual(self.done_events()[0]["truncated"], True)
+        self.debit.assert_called_once_with(["ip:127.0.0.1"], 1)
+
+    def cancel_after_first_token(self, stream):
+        def wrapped(*args, **kwargs):
+            for index, token in enumerate(stream(*args, **kwargs)):
+                yield token
+                if index == 0:
+                    GenerationService.cancel(self.channel)
+        return wrapped
@@ -0,0 +1,76 @@
+from django.core.exceptions import ValidationError
+from django.test import SimpleTestCase, TestCase
+
+from chat.models import Conversation, Message, MessageEmbedding
+
+from .stubs import ScriptedBackend, use_backend
+
+
+class MessageSaveTests(TestCase):
+    def setUp(self):
+        conversation = Conversation.objects.create(title="Chat")
+        message = Message.objects.create(conversation=conversation, content="**Hi**", is_user=False)
+        Message.objects.filter(pk=message.pk).update(
+            rendered_html="<p><strong>Hi</strong></p>", token_count=3
+        )
+        MessageEmbedding.objects.create(
+            message=message, model="nomic-embed-text", vector=MessageEmbedding.pack([1, 0])
+        )
+        self.pk = message.pk
+
+    def test_editing_content_clears_derived_fields(self):
+        message = Message.objects.get(pk=self.pk)
+        message.content = "*Bye*"
+        message.save()
+
+        message.refresh_from_db()
+        self.assertEqual((message.rendered_html, message.token_count), ("", None))
+        self.assertFalse(MessageEmbedding.objects.filter(message_id=self.pk).exists())
+
+    def test_editing_deferred_instance_clears_derived_fields(self):
+        message = Message.objects.only("id", "content").get(pk=self.pk)
+        message.content = "*Bye*"
+        message.save()
+
+        message = Message.objects.get(pk=self.pk)
+        self.assertEqual((message.content, message.rendered_html), ("*Bye*", ""))
+
+    def test_saving_unchanged_content_keeps_derived_fields(self):
+        message = Message.objects.get(pk=self.pk)
+        message.is_truncated = True
+        message.save()
+
+        message.refresh_from_db()
+        self.assertEqual(message.rendered_html, "<p><strong>Hi</strong></p>")
+        self.assertTrue(MessageEmbedding.objects.filter(message_id=self.pk).exists())
+
+    def test_update_fields_include_cleared_fields(self):
+        message = Message.objects.get(pk=self.pk)
+        message.content = "*Bye*"
+        message.save(update_fields=["content"])
+
+        message.refresh_from_db()
+        self.assertEqual(message.rendered_html, "")
+
+
+class ConversationCleanTests(SimpleTestCase):
+    def test_accepts_configured_backend(self):
+        with use_backend(ScriptedBackend):
+            Conversation(backend="ollama", options={"temperature": 0.2}).clean()
+
+    def test_blank_backend_is_the_default(self):
+        Conversation(backend="").clean()
+
+    def test_rejects_unknown_backend(self):
+        with use_backend(ScriptedBackend), self.assertRaises(ValidationError) as raised:
+            Conversation(backend="olama").clean()
+
+        self.assertEqual(
+            raised.exception.message_dict, {"backend": ["No chat backend named 'olama' in CHAT_BACKENDS"]}
+        )
+
+    def test_reports_backend_and_options_together(self):
+        with self.assertRaises(ValidationError) as raised:
+            Conversation(backend="olama", options={"top_k": 5}).clean()
+
+        self.assertEqual(set(raised.exception.message_dict), {"backend", "options"})
@@ -0,0 +1,187 @@
+"""Tests of the PostgreSQL profile, run with POSTGRES_DB set (see the Readme)"""
+
+import io
+import os
+import runpy
+import threading
+from datetime import date, datetime, timezone as dt_timezone
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from chat.models import Conversation, Message, MessageEmbedding
+from chat.partitioning import (
+    TABLE,
+    add_months,
+    existing_partitions,
+    extend_statements,
+    is_partitioned,
+    partition_name,
+)
+from chat.retention import archive_conversations, rehydrate_conversation
+
+SETTINGS_PATH = str(settings.BASE_DIR / "DjangoForAI" / "settings.py")
+
+requires_postgres = skipUnless(
+    connection.vendor == "postgresql", "set POSTGRES_DB to run against PostgreSQL"
+)
+
+
+class DatabaseSettingsTests(SimpleTestCase):
+    def load_settings(self, **environ):
+        with mock.patch.dict(os.environ, environ):
+            return runpy.run_path(SETTINGS_PATH)["DATABASES"]["default"]
+
+    def test_pool_by_default(self):
+        database = self.load_settings(
+            POSTGRES_DB="chat", POSTGRES_POOL="1", POSTGRES_POOL_MIN_SIZE="1", POSTGRES_POOL_MAX_SIZE="4"
+        )
+
+        self.assertEqual(database["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(database["OPTIONS"]["pool"], {"min_size": 1, "max_size": 4, "timeout": 10})
+        self.assertNotIn("CONN_MAX_AGE", database)
+
+    def test_persistent_connections_without_pool(self):
+        database = self.load_settings(POSTGRES_DB="chat", POSTGRES_POOL="0", POSTGRES_CONN_MAX_AGE="60")
+
+        self.assertNotIn("OPTIONS", database)
+        self.assertEqual(database["CONN_MAX_AGE"], 60)
+        self.assertTrue(database["CONN_HEALTH_CHECKS"])
+
+
+@requires_postgres
+@skipUnless(os.environ.get("POSTGRES_POOL", "1") != "0", "the connection pool is disabled")
+class ConnectionPoolTests(TransactionTestCase):
+    def test_threads_share_the_pool(self):
+        pool = connection.pool
+        backends = []
+
+        def query():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_backend_pid()")
+                backends.append(cursor.fetchone()[0])
+            connection.close()
+
+        for _ in range(pool.max_size + 2):
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+
+        # Closing returns the connection to the pool, so later threads reuse it
+        stats = pool.get_stats()
+        self.assertLessEqual(len(set(backends)), stats["pool_size"])
+        self.assertLessEqual(stats["pool_size"], pool.max_size)
+
+
+def month_start(month):
+    return datetime(month.year, month.month, 1, 12, tzinfo=dt_timezone.utc)
+
+
+@requires_postgres
+class PartitionMessagesTests(TestCase):
+    """Partitioning runs in the test's transaction, so the table is restored afterwards"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.conversation = Conversation.objects.create_with_message("Hello")
+        self.old = Message.objects.create(conversation=self.conversation, content="Hi!", is_user=False)
+        self.old_month = add_months(self.today, -2)
+        Message.objects.filter(pk=self.old.pk).update(timestamp=month_start(self.old_month))
+        MessageEmbedding.objects.create(message=self.old, model="test", vector=MessageEmbedding.pack([1.0]))
+
+    def partition(self, **options):
+        # Fire the deferred foreign key checks of the rows above; the command
+        # can't alter a table with pending trigger events
+        connection.check_constraints()
+        output = io.StringIO()
+        call_command("partition_messages", stdout=output, **options)
+        return output.getvalue()
+
+    def partition_of(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT tableoid::regclass::text FROM "{TABLE}" WHERE id = %s', [message.pk])
+            return cursor.fetchone()[0]
+
+    def constraints(self, column):
+        """Get the constraints whose column (conrelid or confrelid) is the message table"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT contype, pg_get_constraintdef(oid) FROM pg_constraint WHERE {column} = %s::regclass",
+                [TABLE],
+            )
+            return cursor.fetchall()
+
+    def test_converts_table_into_monthly_partitions(self):
+        self.assertIn("Partitioned", self.partition(months_ahead=2))
+
+        self.assertTrue(is_partitioned())
+        expected = {partition_name(add_months(self.old_month, offset)) for offset in range(5)}
+        self.assertEqual(existing_partitions(), expected | {f"{TABLE}_default"})
+        self.assertEqual(self.partition_of(self.old), partition_name(self.old_month))
+        self.assertIn(("p", 'PRIMARY KEY (id, "timestamp")'), self.constraints("conrelid"))
+
+    def test_keeps_rows_and_continues_the_sequence(self):
+        ids = set(Message.objects.values_list("pk", flat=True))
+
+        self.partition()
+
+        self.assertEqual(set(Message.objects.values_list("pk", flat=True)), ids)
+        message = Message.objects.create(conversation=self.conversation, content="New", is_user=True)
+        self.assertGreater(message.pk, max(ids))
+        self.assertEqual(self.partition_of(message), partition_name(self.today.replace(day=1)))
+
+    def test_rows_outside_the_partitions_go_to_the_default(self):
+        self.partition(months_ahead=1)
+
+        Message.objects.filter(pk=self.old.pk).update(timestamp=month_start(add_months(self.today, 12)))
+
+        self.assertEqual(self.partition_of(self.old), f"{TABLE}_default")
+
+    def test_creates_upcoming_partitions_when_run_again(self):
+        self.partition(months_ahead=1)
+
+        self.assertEqual(self.partition(months_ahead=3), "Created 2 partitions\n")
+        self.assertIn(partition_name(add_months(self.today, 3)), existing_partitions())
+        self.assertEqual(self.partition(months_ahead=3), "Created 0 partitions\n")
+
+    def test_rolls_over_into_the_next_month(self):
+        self.partition(months_ahead=1)
+
+        next_month = add_months(self.today, 1)
+        statements = extend_statements(1, today=date(next_month.year, next_month.month, 15))
+
+        self.assertEqual(len(statements), 1)
+        self.assertIn(f'"{partition_name(add_months(self.today, 2))}"', statements[0])
+
+    def test_drops_embedding_foreign_key_but_orm_still_cascades(self):
+        self.partition()
+
+        self.assertEqual(self.constraints("confrelid"), [])
+        self.old.delete()
+        self.assertFalse(MessageEmbedding.objects.exists())
+
+    def test_conversation_delete_cascades_to_messages_and_embeddings(self):
+        self.partition()
+
+        self.conversation.delete()
+
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MessageEmbedding.objects.exists())
+
+    def test_archives_and_rehydrates_partitioned_messages(self):
+        self.partition()
+
+        self.assertEqual(archive_conversations([self.conversation.pk], "gzip"), (1, 2))
+        self.assertFalse(Message.objects.exists())
+        self.assertFalse(MessageEmbedding.objects.exists())
+
+        restored = rehydrate_conversation(self.conversation.pk)
+
+        self.assertEqual(restored.messages.count(), 2)
+        self.assertEqual(
+            self.partition_of(restored.messages.get(pk=self.old.pk)), partition_name(self.old_month)
+        )
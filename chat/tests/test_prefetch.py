@@ -0,0 +1,74 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from chat.constants import CONVERSATION_CONTEXT_LIMIT
+from chat.models import Conversation, Message
+from chat.services import OllamaService, PrefetchService
+
+from .stubs import ScriptedBackend, use_backend, wait_for
+
+
+class WarmingBackend(ScriptedBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.warmed = []
+
+    def warm(self, messages, model=None, options=None, keep_alive=None):
+        self.warmed.append(messages)
+        return True
+
+
+class PrefetchTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        mock.patch("chat.services.get_pipeline").start()
+        self.addCleanup(mock.patch.stopall)
+        self.conversation = Conversation.objects.create_with_message("m1")
+        for number in range(2, CONVERSATION_CONTEXT_LIMIT + 3):
+            Message.objects.create(
+                conversation=self.conversation, content=f"m{number}", is_user=number % 2 == 1
+            )
+
+    def prefetch(self):
+        self.assertTrue(PrefetchService.prefetch(self.conversation))
+        wait_for(lambda: cache.get(f"{PrefetchService.key(self.conversation.id)}:warm"))
+
+    def add_user_message(self):
+        Message.objects.create(conversation=self.conversation, content="new", is_user=True)
+        return OllamaService.format_messages(self.conversation)
+
+    def test_warms_the_prefix_of_the_next_generation(self):
+        with use_backend(WarmingBackend) as backend:
+            self.prefetch()
+            messages = self.add_user_message()
+
+        self.assertEqual(backend.warmed, [messages[:-1]])
+        self.assertTrue(
+            PrefetchService.consume_warm(
+                self.conversation.id, messages, self.conversation.generation_settings()
+            )
+        )
+
+    def test_warm_is_consumed_once(self):
+        with use_backend(WarmingBackend):
+            self.prefetch()
+            messages = self.add_user_message()
+        settings = self.conversation.generation_settings()
+
+        PrefetchService.consume_warm(self.conversation.id, messages, settings)
+
+        self.assertFalse(PrefetchService.consume_warm(self.conversation.id, messages, settings))
+
+    def test_different_prompt_is_not_warm(self):
+        with use_backend(WarmingBackend):
+            self.prefetch()
+            messages = self.add_user_message()
+        related = [{"role": "user", "content": "m1"}]
+
+        self.assertFalse(
+            PrefetchService.consume_warm(
+                self.conversation.id, related + messages, self.conversation.generation_settings()
+            )
+        )
@@ -0,0 +1,139 @@
+import json
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from chat.profiling import ProfilingMiddleware, in_request_context, span
+
+
+def parse_server_timing(value):
+    """Get {name: (milliseconds, description)} from a Server-Timing header"""
+    metrics = {}
+    for metric in value.split(", "):
+        name, *params = metric.split(";")
+        params = dict(param.split("=", 1) for param in params)
+        metrics[name] = (float(params["dur"]), params.get("desc", "").strip('"'))
+    return metrics
+
+
+@override_settings(CHAT_PROFILING=True, CHAT_PROFILING_SLOW_MS=60000, DEBUG=False)
+class ProfilingMiddlewareTests(TestCase):
+    def handle(self, view, **headers):
+        request = RequestFactory().get("/chat/1/", headers=headers)
+        return ProfilingMiddleware(view)(request)
+
+    def test_disabled_without_setting(self):
+        with override_settings(CHAT_PROFILING=False), self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: HttpResponse())
+
+    def test_server_timing_totals_spans_by_name(self):
+        def view(request):
+            for _ in range(2):
+                with span("model.chat"):
+                    time.sleep(0.01)
+            with span("markdown"):
+                pass
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return HttpResponse()
+
+        metrics = parse_server_timing(self.handle(view)["Server-Timing"])
+
+        self.assertEqual(list(metrics), ["model.chat", "markdown", "db", "total"])
+        self.assertEqual(metrics["model.chat"][1], "2x")
+        self.assertGreaterEqual(metrics["model.chat"][0], 20)
+        self.assertEqual(metrics["db"][1], "1x")
+        self.assertGreaterEqual(metrics["total"][0], metrics["model.chat"][0])
+
+    def test_request_context_threads_record_nested_spans(self):
+        def work():
+            with span("generation"):
+                with span("model.stream"):
+                    time.sleep(0.02)
+                time.sleep(0.01)
+
+        def view(request):
+            threads = [
+                threading.Thread(target=in_request_context(work)),
+                # Like the post-turn pipeline's workers, outside the request's context
+                threading.Thread(target=work),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return HttpResponse()
+
+        metrics = parse_server_timing(self.handle(view)["Server-Timing"])
+
+        self.assertEqual(metrics["generation"][1], "1x")
+        self.assertGreaterEqual(metrics["model.stream"][0], 20)
+        self.assertGreaterEqual(metrics["generation"][0], metrics["model.stream"][0] + 10)
+
+    def test_fast_request_is_not_logged(self):
+        with self.assertNoLogs("chat.profiling"):
+            self.handle(lambda request: HttpResponse())
+
+    @override_settings(CHAT_PROFILING_SLOW_MS=10)
+    def test_slow_request_is_logged_with_its_spans(self):
+        def view(request):
+            with span("model.chat"):
+                time.sleep(0.02)
+            return HttpResponse(status=201)
+
+        with self.assertLogs("chat.profiling", "WARNING") as logs:
+            self.handle(view)
+
+        (record,) = logs.records
+        trace = json.loads(record.getMessage())
+        self.assertEqual((trace["event"], trace["path"], trace["status"]), ("slow_request", "/chat/1/", 201))
+        self.assertEqual([item["name"] for item in trace["spans"]], ["model.chat"])
+        self.assertGreaterEqual(trace["duration_ms"], 20)
+
+    @override_settings(CHAT_PROFILING_SLOW_MS=10)
+    def test_stream_is_slow_when_its_first_chunk_is(self):
+        def chunks(first_delay):
+            time.sleep(first_delay)
+            yield b"first"
+            time.sleep(0.02)
+            yield b"rest"
+
+        with self.assertNoLogs("chat.profiling"):
+            b"".join(self.handle(lambda request: StreamingHttpResponse(chunks(0))).streaming_content)
+
+        with self.assertLogs("chat.profiling", "WARNING") as logs:
+            b"".join(self.handle(lambda request: StreamingHttpResponse(chunks(0.02))).streaming_content)
+        spans = json.loads(logs.records[0].getMessage())["spans"]
+        self.assertEqual([item["name"] for item in spans], ["stream.first_chunk"])
+
+
+@override_settings(CHAT_PROFILING=True, CHAT_PROFILING_SLOW_MS=60000)
+class ProfileDumpTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.enterContext(override_settings(CHAT_PROFILE_DIR=self.directory))
+
+    def handle(self):
+        request = RequestFactory().get("/chat/1/", headers={"X-Chat-Profile": "cprofile"})
+        return ProfilingMiddleware(lambda request: HttpResponse())(request)
+
+    @override_settings(DEBUG=True)
+    def test_profiles_request_with_debug(self):
+        response = self.handle()
+
+        self.assertTrue((self.directory / response["X-Chat-Profile-Dump"]).exists())
+
+    @override_settings(DEBUG=False)
+    def test_ignores_profile_header_without_debug(self):
+        response = self.handle()
+
+        self.assertNotIn("X-Chat-Profile-Dump", response)
+        self.assertEqual(list(self.directory.iterdir()), [])
@@ -0,0 +1,225 @@
+import json
+import threading
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.utils import timezone
+
+from chat.models import StreamEvent
+from chat.pubsub import DatabaseTokenBus, InProcessTokenBus, RedisTokenBus
+from chat.services import GenerationService
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client calls RedisTokenBus makes"""
+
+    def __init__(self):
+        self.streams = {}
+        self.expires = {}
+        self.now = 0.0
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+    def xadd(self, name, fields):
+        with self._condition:
+            self._sequence += 1
+            entry_id = f"{self._sequence}-0".encode()
+            encoded = {key.encode(): value.encode() for key, value in fields.items()}
+            self.streams.setdefault(name, []).append((entry_id, encoded))
+            self._condition.notify_all()
+            return entry_id
+
+    def expire(self, name, seconds):
+        self.expires[name] = self.now + seconds
+
+    def advance(self, seconds):
+        """Move the fake clock, dropping the streams that expired"""
+        with self._condition:
+            self.now += seconds
+            for name, deadline in list(self.expires.items()):
+                if deadline <= self.now:
+                    self.streams.pop(name, None)
+                    del self.expires[name]
+
+    def xread(self, streams, block=None):
+        ((name, last_id),) = streams.items()
+        position = int(str(last_id.decode() if isinstance(last_id, bytes) else last_id).split("-")[0])
+        deadline = time.monotonic() + (block or 0) / 1000
+        with self._condition:
+            while True:
+                entries = [
+                    (entry_id, fields) for entry_id, fields in self.streams.get(name, [])
+                    if int(entry_id.split(b"-")[0]) > position
+                ]
+                remaining = deadline - time.monotonic()
+                if entries or remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+        return [[name.encode(), entries]] if entries else []
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def xadd(self, *args):
+        self.calls.append(("xadd", args))
+
+    def expire(self, *args):
+        self.calls.append(("expire", args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.calls]
+
+
+class TokenBusContract:
+    """Publish/subscribe behaviour every token bus provides"""
+
+    def make_bus(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()
+        self.bus = self.make_bus()
+
+    def collect(self, channel, timeout=1):
+        return list(self.bus.subscribe(channel, timeout=timeout))
+
+    def test_late_subscriber_replays_from_start(self):
+        self.bus.publish("chat:message:1", {"type": "token", "content": "Hel"})
+        self.bus.publish("chat:message:1", {"type": "token", "content": "lo"})
+        self.bus.publish("chat:message:1", {"type": "done", "timestamp": "1:00 PM"})
+
+        self.assertEqual(
+            [event["type"] for event in self.collect("chat:message:1")],
+            ["token", "token", "done"],
+        )
+        self.assertEqual(self.collect("chat:message:1")[1]["content"], "lo")
+
+    def test_stops_at_terminal_event(self):
+        self.bus.publish("chat:message:2", {"type": "error", "content": "failed"})
+        self.bus.publish("chat:message:2", {"type": "token", "content": "ignored"})
+
+        self.assertEqual(self.collect("chat:message:2"), [{"type": "error", "content": "failed"}])
+
+    def test_channels_are_separate(self):
+        self.bus.publish("chat:message:3", {"type": "done"})
+        self.bus.publish("chat:message:4", {"type": "token", "content": "x"})
+        self.bus.publish("chat:message:4", {"type": "done"})
+
+        self.assertEqual(len(self.collect("chat:message:3")), 1)
+        self.assertEqual(len(self.collect("chat:message:4")), 2)
+
+    def test_times_out_without_events(self):
+        events = self.collect("chat:message:5", timeout=0.2)
+
+        self.assertEqual(events, [self.bus.timeout_event()])
+
+    def test_fans_out_to_live_subscribers(self):
+        received = [[], []]
+
+        def subscribe(events):
+            try:
+                events.extend(self.bus.subscribe("chat:message:6", timeout=5))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=subscribe, args=(events,)) for events in received]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        for token in ("a", "b", "c"):
+            self.bus.publish("chat:message:6", {"type": "token", "content": token})
+        self.bus.publish("chat:message:6", {"type": "done"})
+        for thread in threads:
+            thread.join(5)
+
+        for events in received:
+            self.assertEqual(
+                [event.get("content") for event in events], ["a", "b", "c", None]
+            )
+
+
+class InProcessTokenBusTests(TokenBusContract, SimpleTestCase):
+    def make_bus(self):
+        return InProcessTokenBus()
+
+    def test_expires_idle_channels(self):
+        bus = InProcessTokenBus(channel_ttl=0.05)
+        bus.publish("chat:message:1", {"type": "done"})
+        time.sleep(0.1)
+        bus.publish("chat:message:2", {"type": "done"})
+
+        self.assertEqual(bus._events("chat:message:1"), [])
+        self.assertEqual(len(bus._events("chat:message:2")), 1)
+
+
+class DatabaseTokenBusTests(TokenBusContract, TransactionTestCase):
+    def make_bus(self):
+        return DatabaseTokenBus(poll_interval=0.01)
+
+    def test_terminal_event_deletes_expired_events(self):
+        self.bus.publish("chat:message:1", {"type": "done"})
+        StreamEvent.objects.update(created_at=timezone.now() - timedelta(seconds=301))
+        self.bus.publish("chat:message:2", {"type": "token", "content": "x"})
+
+        self.assertEqual(StreamEvent.objects.count(), 2)
+
+        self.bus.publish("chat:message:2", {"type": "done"})
+
+        self.assertEqual(
+            set(StreamEvent.objects.values_list("channel", flat=True)), {"chat:message:2"}
+        )
+
+
+class RedisTokenBusTests(TokenBusContract, SimpleTestCase):
+    def make_bus(self):
+        self.client = FakeRedis()
+        return RedisTokenBus(channel_ttl=300, client=self.client)
+
+    def test_publish_refreshes_channel_expiry(self):
+        self.bus.publish("chat:message:1", {"type": "token", "content": "x"})
+        self.client.advance(200)
+        self.bus.publish("chat:message:1", {"type": "done"})
+        self.client.advance(200)
+
+        self.assertEqual(len(self.collect("chat:message:1")), 2)
+
+        self.client.advance(101)
+
+        self.assertEqual(self.collect("chat:message:1", timeout=0.1), [self.bus.timeout_event()])
+
+    def test_events_are_stored_as_json(self):
+        self.bus.publish("chat:message:1", {"type": "done", "truncated": True})
+
+        (_, fields), = self.client.streams["chat:message:1"]
+        self.assertEqual(json.loads(fields[b"event"]), {"type": "done", "truncated": True})
+
+
+class SubscriberCountTests(SimpleTestCase):
+    channel = "chat:message:42"
+
+    def setUp(self):
+        cache.clear()
+
+    def test_last_subscriber_leaving_cancels_generation(self):
+        GenerationService.add_subscriber(self.channel)
+        GenerationService.add_subscriber(self.channel)
+
+        GenerationService.remove_subscriber(self.channel)
+        self.assertFalse(GenerationService.is_cancelled(self.channel))
+
+        GenerationService.remove_subscriber(self.channel)
+        self.assertTrue(GenerationService.is_cancelled(self.channel))
+
+    def test_leaving_unknown_channel_cancels_generation(self):
+        GenerationService.remove_subscriber(self.channel)
+
+        self.assertTrue(GenerationService.is_cancelled(self.channel))
@@ -0,0 +1,97 @@
+import json
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from chat.models import Conversation
+from chat.ratelimit import TokenBucket, debit_tokens, tokens_exhausted
+
+from .stubs import ScriptedBackend, use_backend
+
+IDENTITIES = ["ip:127.0.0.1"]
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_acquire_until_empty(self):
+        bucket = TokenBucket("requests", 2, 0.001)
+
+        self.assertEqual(bucket.acquire(IDENTITIES), 0)
+        self.assertEqual(bucket.acquire(IDENTITIES), 0)
+        self.assertGreater(bucket.acquire(IDENTITIES), 0)
+
+    def test_debit_overdraws(self):
+        debit_tokens(IDENTITIES, 25000)
+
+        self.assertGreater(tokens_exhausted(IDENTITIES), 0)
+
+    def test_overdrawn_bucket_is_kept_until_repaid(self):
+        bucket = TokenBucket("tokens", 20000, 10)
+
+        with mock.patch("chat.ratelimit.cache.set_many") as set_many:
+            bucket.debit(IDENTITIES, 60000)
+
+        # 60,000 tokens below capacity at 10 per second
+        self.assertEqual(set_many.call_args.args[1], 6000)
+
+    def test_bucket_is_kept_at_least_a_second(self):
+        bucket = TokenBucket("requests", 20, 1000)
+
+        with mock.patch("chat.ratelimit.cache.set_many") as set_many:
+            bucket.acquire(IDENTITIES)
+
+        self.assertEqual(set_many.call_args.args[1], 1)
+
+
+class BatchRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.backend = self.enterContext(use_backend(ScriptedBackend))
+        self.backend.eval_count = 60
+
+    def post_batch(self, prompts):
+        return self.client.post(
+            "/api/batch/",
+            json.dumps({"prompts": prompts, "concurrency": 1}),
+            content_type="application/json",
+        )
+
+    @override_settings(CHAT_RATE_LIMITS={"tokens": (100, 0.001)})
+    def test_batch_debits_generated_tokens_per_prompt(self):
+        response = self.post_batch(["a", "b", "c"])
+
+        results = sorted(response.json()["results"], key=lambda result: result["id"])
+        # 60 tokens each: the second prompt overdraws the quota, the third is refused
+        self.assertEqual([result["error"] is None for result in results], [True, True, False])
+        self.assertEqual(results[2]["attempts"], 0)
+        self.assertEqual(len(self.backend.requests), 2)
+
+        self.assertEqual(self.post_batch(["d"]).status_code, 429)
+
+    @override_settings(CHAT_RATE_LIMITS={"tokens": None})
+    def test_batch_without_token_quota_runs_every_prompt(self):
+        response = self.post_batch(["a", "b", "c"])
+
+        self.assertEqual(response.json()["report"]["succeeded"], 3)
+
+
+@override_settings(CHAT_RATE_LIMITS={"requests": (1, 0.001)})
+class PrefetchRateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_prefetches_count_against_the_request_limit(self):
+        conversations = [Conversation.objects.create_with_message("Hi") for _ in range(2)]
+
+        with mock.patch("chat.views_stream.PrefetchService.prefetch", return_value=True) as prefetch:
+            responses = [
+                self.client.post(reverse("prefetch", args=[conversation.pk]))
+                for conversation in conversations
+            ]
+
+        self.assertEqual([response.status_code for response in responses], [202, 429])
+        prefetch.assert_called_once()
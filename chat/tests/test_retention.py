@@ -0,0 +1,51 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from chat.models import Conversation, ConversationArchive, Message
+from chat.retention import archive_conversations, rehydrate_conversation
+
+
+class ArchiveConversationsTests(TestCase):
+    def create_conversation(self):
+        conversation = Conversation.objects.create_with_message("Hello")
+        Message.objects.create(conversation=conversation, content="Hi!", is_user=False)
+        return conversation
+
+    def test_archives_and_rehydrates(self):
+        conversation = self.create_conversation()
+
+        self.assertEqual(archive_conversations([conversation.pk], "gzip"), (1, 2))
+        self.assertFalse(Conversation.objects.exists())
+        self.assertFalse(Message.objects.exists())
+
+        restored = rehydrate_conversation(conversation.pk)
+
+        self.assertEqual(restored.created_at, conversation.created_at)
+        self.assertEqual(
+            list(restored.messages.values_list("content", flat=True)), ["Hello", "Hi!"]
+        )
+        self.assertFalse(ConversationArchive.objects.exists())
+
+    def test_skips_conversation_with_message_after_selection(self):
+        selected_at = timezone.now()
+        conversation = self.create_conversation()
+        Conversation.objects.filter(pk=conversation.pk).update(
+            updated_at=selected_at - timedelta(days=1)
+        )
+        Message.objects.filter(conversation=conversation).update(
+            timestamp=selected_at - timedelta(days=1)
+        )
+        Message.objects.create(conversation=conversation, content="Still there?", is_user=True)
+
+        self.assertEqual(archive_conversations([conversation.pk], "gzip", selected_at), (0, 0))
+        self.assertEqual(conversation.messages.count(), 3)
+        self.assertFalse(ConversationArchive.objects.exists())
+
+    def test_skips_conversation_updated_after_selection(self):
+        selected_at = timezone.now() - timedelta(minutes=1)
+        conversation = self.create_conversation()
+
+        self.assertEqual(archive_conversations([conversation.pk], "gzip", selected_at), (0, 0))
+        self.assertTrue(Conversation.objects.filter(pk=conversation.pk).exists())
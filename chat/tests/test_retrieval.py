@@ -0,0 +1,93 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from chat.constants import CONVERSATION_CONTEXT_LIMIT
+from chat.models import Conversation, Message, MessageEmbedding
+from chat.services import EmbeddingService, OllamaService
+
+from .stubs import ScriptedBackend, use_backend
+
+VECTORS = {
+    "cats": [1.0, 0.0, 0.0],
+    "kittens": [0.9, 0.1, 0.0],
+    "dogs": [0.0, 1.0, 0.0],
+    "tell me about cats": [1.0, 0.05, 0.0],
+}
+
+
+class RetrievalTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.enterContext(override_settings(CHAT_RETRIEVAL_ENABLED=True))
+        self.enterContext(mock.patch("chat.services.get_pipeline"))
+        self.backend = self.enterContext(use_backend(ScriptedBackend))
+        self.backend.vectors = VECTORS
+        self.conversation = Conversation.objects.create(title="Pets")
+
+    def add(self, content, conversation=None, embed=True):
+        message = Message.objects.create(
+            conversation=conversation or self.conversation, content=content, is_user=True
+        )
+        if embed:
+            EmbeddingService.embed(message)
+        return message
+
+    def test_related_messages_come_from_the_same_conversation(self):
+        cats, kittens, _ = self.add("cats"), self.add("kittens"), self.add("dogs")
+        self.add("cats", conversation=Conversation.objects.create(title="Other"))
+        query = self.add("tell me about cats", embed=False)
+
+        related = EmbeddingService.related_messages(query, k=2)
+
+        self.assertEqual(related, [cats, kittens])
+
+    def test_related_messages_skip_excluded_ones(self):
+        cats, kittens = self.add("cats"), self.add("kittens")
+        query = self.add("tell me about cats", embed=False)
+
+        self.assertEqual(EmbeddingService.related_messages(query, [cats.id], k=2), [kittens])
+
+    def test_format_messages_puts_related_messages_first(self):
+        cats = self.add("cats")
+        for _ in range(CONVERSATION_CONTEXT_LIMIT):
+            self.add("dogs", embed=False)
+        query = self.add("tell me about cats", embed=False)
+
+        messages = OllamaService.format_messages(self.conversation, query=query)
+
+        self.assertEqual(len(messages), CONVERSATION_CONTEXT_LIMIT + 1)
+        self.assertEqual(messages[0]["content"], cats.content)
+
+    def test_embedding_is_stored_once(self):
+        message = self.add("cats", embed=False)
+
+        first = EmbeddingService.embed(message)
+        second = EmbeddingService.embed(message)
+
+        self.assertEqual(first, second)
+        self.assertEqual(self.backend.embedded, ["cats"])
+        self.assertEqual(MessageEmbedding.objects.filter(message=message).count(), 1)
+
+    def test_waits_for_embedding_in_progress_elsewhere(self):
+        message = self.add("cats", embed=False)
+        cache.add(f"chat:embedding:{message.id}:claimed", True)
+
+        def embed_elsewhere():
+            time.sleep(0.2)
+            MessageEmbedding.objects.create(
+                message=message, model="nomic-embed-text", vector=MessageEmbedding.pack([1, 0, 0])
+            )
+            connection.close()
+
+        thread = threading.Thread(target=embed_elsewhere)
+        thread.start()
+        vector = EmbeddingService.embed(message)
+        thread.join()
+
+        self.assertEqual(vector, [1.0, 0.0, 0.0])
+        self.assertEqual(self.backend.embedded, [])
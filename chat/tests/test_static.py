@@ -0,0 +1,66 @@
+import io
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+import httpx
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+
+from chat.constants import VENDOR_ASSETS
+
+# Shaped like the real files: minified code ending in a source map comment,
+# and the icon font stylesheet referencing its fonts with a version query
+ASSETS = {
+    ".css": b".btn{color:red}\n/*# sourceMappingURL=bootstrap.min.css.map */",
+    ".js": b"!function(){}();\n//# sourceMappingURL=bootstrap.bundle.min.js.map\n",
+    "bootstrap-icons.css": (
+        b'@font-face{font-family:"bootstrap-icons";'
+        b'src:url("./fonts/bootstrap-icons.woff2?8d200481aa7f02a2d63a331fc782cfaf") format("woff2"),'
+        b'url("./fonts/bootstrap-icons.woff?8d200481aa7f02a2d63a331fc782cfaf") format("woff")}'
+    ),
+}
+
+
+def fake_cdn(request):
+    path = request.url.path
+    for suffix, content in reversed(ASSETS.items()):
+        if path.endswith(suffix):
+            return httpx.Response(200, content=content)
+    return httpx.Response(200, content=b"\x00font")
+
+
+class VendorStaticTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.static_dir = Path(directory.name) / "static"
+        self.static_root = Path(directory.name) / "root"
+        client = httpx.Client
+        self.enterContext(mock.patch(
+            "chat.management.commands.vendor_static.httpx.Client",
+            lambda **kwargs: client(transport=httpx.MockTransport(fake_cdn), **kwargs),
+        ))
+
+    def vendor(self):
+        call_command("vendor_static", static_dir=self.static_dir, stdout=io.StringIO())
+
+    def test_strips_source_map_comments(self):
+        self.vendor()
+
+        for path in VENDOR_ASSETS:
+            self.assertNotIn(b"sourceMappingURL", (self.static_dir / path).read_bytes(), path)
+
+    def test_collectstatic_hashes_vendored_assets(self):
+        self.vendor()
+
+        with override_settings(STATICFILES_DIRS=[self.static_dir], STATIC_ROOT=self.static_root):
+            staticfiles_storage._setup()
+            self.addCleanup(staticfiles_storage._setup)
+            call_command("collectstatic", interactive=False, verbosity=0)
+
+            for path in VENDOR_ASSETS:
+                hashed = staticfiles_storage.stored_name(path)
+                self.assertNotEqual(hashed, path)
+                self.assertTrue((self.static_root / hashed).exists(), hashed)
@@ -0,0 +1,60 @@
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from chat.models import Conversation
+from chat.pubsub import DatabaseTokenBus, channel_for_message
+
+from .stubs import wait_for
+
+
+class RecordingTokenBus(DatabaseTokenBus):
+    """Database bus remembering the threads its subscriptions were iterated in"""
+
+    def __init__(self):
+        super().__init__(poll_interval=0.01)
+        self.threads = set()
+
+    def subscribe(self, channel, timeout=1):
+        for event in super().subscribe(channel, timeout):
+            self.threads.add(threading.get_ident())
+            yield event
+
+
+class AsyncStreamTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.conversation = Conversation.objects.create_with_message("Hi")
+        self.user_message = self.conversation.messages.get()
+        self.channel = channel_for_message(self.user_message.pk)
+        self.bus = RecordingTokenBus()
+        for token in ("Hel", "lo", "!"):
+            self.bus.publish(self.channel, {"type": "token", "content": token})
+        self.bus.publish(self.channel, {"type": "done"})
+
+        self.closed_in = []
+
+        def close():
+            self.closed_in.append(threading.get_ident())
+            connection.close()
+
+        self.enterContext(mock.patch("chat.views_stream.get_token_bus", lambda: self.bus))
+        self.enterContext(mock.patch("chat.views_stream.connection", mock.Mock(close=close)))
+        self.enterContext(mock.patch("chat.services.GenerationService.start", return_value=self.channel))
+
+    async def test_relays_events_from_one_thread_and_closes_its_connection(self):
+        url = reverse("stream_chat", args=[self.conversation.pk])
+        response = await self.async_client.get(url, {"message_id": self.user_message.pk})
+        body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+        await sync_to_async(wait_for)(lambda: self.closed_in)
+
+        events = [json.loads(line[6:]) for line in body.split("\n\n") if line]
+        self.assertEqual([event.get("content") for event in events], ["Hel", "lo", "!", None])
+        self.assertEqual(len(self.bus.threads), 1)
+        self.assertEqual(self.closed_in, list(self.bus.threads))
@@ -0,0 +1,92 @@
+import io
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from chat.models import Conversation, ConversationArchive, Message
+from chat.retention import archive_conversations, rehydrate_conversation
+
+
+class ImportConversationsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "export.jsonl"
+
+    def export(self):
+        call_command("export_conversations", str(self.path), stderr=io.StringIO())
+
+    def import_file(self):
+        stderr = io.StringIO()
+        call_command("import_conversations", str(self.path), stderr=stderr)
+        return stderr.getvalue()
+
+    def create_exported_conversation(self):
+        conversation = Conversation.objects.create_with_message("Hello")
+        Message.objects.create(conversation=conversation, content="Hi!", is_user=False)
+        self.export()
+        return conversation
+
+    def test_round_trip_into_empty_database(self):
+        conversation = self.create_exported_conversation()
+        Conversation.objects.all().delete()
+
+        output = self.import_file()
+
+        self.assertIn("Inserted 1 conversations, 2 messages and 0 archived conversations", output)
+        imported = Conversation.objects.get(pk=conversation.pk)
+        self.assertEqual(imported.created_at, conversation.created_at)
+        self.assertEqual(
+            list(imported.messages.values_list("content", flat=True)), ["Hello", "Hi!"]
+        )
+
+    def test_reimport_skips_rows_already_imported(self):
+        self.create_exported_conversation()
+
+        output = self.import_file()
+
+        self.assertIn("Inserted 0 conversations, 0 messages and 0 archived conversations", output)
+        self.assertIn("skipped 1 conversations, 2 messages and 0 archived conversations", output)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_conflicting_conversation_id_aborts(self):
+        conversation = self.create_exported_conversation()
+        Conversation.objects.all().delete()
+        unrelated = Conversation.objects.create(pk=conversation.pk, title="Unrelated")
+
+        with self.assertRaisesMessage(CommandError, f"Conversation {conversation.pk} already exists"):
+            self.import_file()
+
+        self.assertFalse(unrelated.messages.exists())
+
+    def test_message_of_conversation_missing_from_file_aborts(self):
+        conversation = self.create_exported_conversation()
+        lines = self.path.read_text().splitlines(keepends=True)
+        self.path.write_text("".join(line for line in lines if '"type": "message"' in line))
+        Message.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, f"conversation {conversation.pk}, which is not in the file"):
+            self.import_file()
+
+        self.assertFalse(Message.objects.exists())
+
+    def test_archived_conversations_are_transferred(self):
+        archived = Conversation.objects.create_with_message("Old")
+        Message.objects.create(conversation=archived, content="Reply " * 200, is_user=False)
+        archive_conversations([archived.pk], "gzip")
+        self.create_exported_conversation()
+        archive = ConversationArchive.objects.get()
+        Conversation.objects.all().delete()
+        ConversationArchive.objects.all().delete()
+
+        output = self.import_file()
+
+        self.assertIn("and 1 archived conversations;", output)
+        imported = ConversationArchive.objects.get()
+        self.assertEqual(bytes(imported.payload), bytes(archive.payload))
+        self.assertEqual(imported.archived_at, archive.archived_at)
+        restored = rehydrate_conversation(archived.pk)
+        self.assertEqual(restored.messages.last().content, "Reply " * 200)
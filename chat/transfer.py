@@ -0,0 +1,120 @@
+"""JSONL serialization helpers for moving conversation data in bulk"""
+
+import base64
+import datetime
+import gzip
+import json
+import sys
+from contextlib import contextmanager
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from .models import Conversation, ConversationArchive, Message
+
+# In export order, so every message's conversation is loaded before it
+TRANSFER_MODELS = {
+    "conversation": Conversation,
+    "message": Message,
+    "archive": ConversationArchive,
+}
+
+
+class TransferJSONEncoder(DjangoJSONEncoder):
+    """JSON encoder keeping full microsecond precision for datetimes, and binary data as base64"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        if isinstance(o, (bytes, memoryview)):
+            return base64.b64encode(o).decode()
+        return super().default(o)
+
+
+def record_fields(model):
+    """Get the column attribute names serialized for a model"""
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def dumps_record(record_type, values):
+    """Serialize a row returned by .values() as one JSONL line"""
+    return json.dumps({"type": record_type, **values}, cls=TransferJSONEncoder) + "\n"
+
+
+def loads_record(line):
+    """Parse a JSONL line into its record type and an unsaved model instance"""
+    values = json.loads(line)
+    record_type = values.pop("type")
+    model = TRANSFER_MODELS[record_type]
+    for field in model._meta.concrete_fields:
+        if isinstance(field, models.BinaryField) and field.attname in values:
+            values[field.attname] = field.to_python(values[field.attname])
+    return record_type, model(**values)
+
+
+def auto_timestamp_fields(model):
+    """Get the fields a model fills in automatically on save"""
+    return [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+
+
+def bulk_create_preserving_timestamps(model, rows):
+    """Bulk insert rows from .values(), keeping their original timestamps
+
+    Safe to use while other threads save rows, unlike preserve_timestamps(),
+    at the cost of an extra bulk update.
+    """
+    instances = [model(**values) for values in rows]
+    model.objects.bulk_create(instances)
+    fields = [field.attname for field in auto_timestamp_fields(model)]
+    if instances and fields:
+        for instance, values in zip(instances, rows):
+            for name in fields:
+                setattr(instance, name, values[name])
+        model.objects.bulk_update(instances, fields)
+    return instances
+
+
+def open_jsonl(path, mode, compress=None):
+    """Open a JSONL file, or stdin/stdout for "-", gzip-compressed if requested
+
+    Compression defaults to whether the path ends in ``.gz``.
+    """
+    if path == "-":
+        stream = sys.stdin if "r" in mode else sys.stdout
+        return gzip.open(stream.buffer, mode + "t", encoding="utf-8") if compress else stream
+    if compress is None:
+        compress = str(path).endswith(".gz")
+    opener = gzip.open if compress else open
+    return opener(path, mode + "t", encoding="utf-8")
+
+
+def close_jsonl(stream):
+    """Close a stream from open_jsonl, leaving stdin/stdout open"""
+    if stream not in (sys.stdin, sys.stdout):
+        stream.close()
+
+
+@contextmanager
+def preserve_timestamps():
+    """Disable auto_now/auto_now_add so saved rows keep their original timestamps
+
+    Affects every thread in the process, so only use it in management commands.
+    """
+    fields = [
+        field
+        for model in TRANSFER_MODELS.values()
+        for field in auto_timestamp_fields(model)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
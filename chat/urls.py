@@ -1,6 +1,12 @@
 from django.urls import path
 from . import views
-from .views_stream import StreamChatView, RenderMarkdownView
+from .views_stream import (
+    StreamChatView,
+    StopGenerationView,
+    PrefetchView,
+    RenderMarkdownView,
+    BatchCompleteView,
+)
 
 urlpatterns = [
     path("", views.HomepageView.as_view(), name="homepage"),
@@ -10,9 +16,20 @@ urlpatterns = [
         StreamChatView.as_view(),
         name="stream_chat",
     ),
+    path(
+        "chat/<int:conversation_id>/stop/",
+        StopGenerationView.as_view(),
+        name="stop_generation",
+    ),
+    path(
+        "chat/<int:conversation_id>/prefetch/",
+        PrefetchView.as_view(),
+        name="prefetch",
+    ),
     path(
         "chat/<int:conversation_id>/render-markdown/",
         RenderMarkdownView.as_view(),
         name="render_markdown",
     ),
+    path("api/batch/", BatchCompleteView.as_view(), name="batch_complete"),
 ]
@@ -0,0 +1,181 @@
+"""Append-only vector index memory-mapped from disk
+
+Records are fixed-size (id, group, unit vector) rows in a single file, so an
+append is one write and the file can be memory-mapped as a NumPy structured
+array. Vectors are normalized when added, making cosine similarity a dot
+product that is computed in blocks to bound memory use. Requires NumPy.
+
+Groups are interleaved in the file, so every search reads all of it. To
+search a small set such as one conversation, load its vectors and score them
+with top_k() instead; retrieval does this with the stored MessageEmbedding
+rows, which stay in step with edits and archiving. benchmark_vector_index
+compares the two.
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEARCH_BLOCK_SIZE = 65536  # rows scored per block
+
+
+def unpack_vectors(packed):
+    """Stack vectors packed as float32 bytes, as in MessageEmbedding.vector, into a matrix"""
+    if np is None:
+        raise ImproperlyConfigured("Vector search requires the 'numpy' package")
+    data = b"".join(bytes(vector) for vector in packed)
+    return np.frombuffer(data, dtype=np.float32).reshape(len(packed), -1)
+
+
+def top_k(query, ids, vectors, k):
+    """Get the k (id, score) pairs whose vectors are most cosine-similar to query, best first"""
+    if np is None:
+        raise ImproperlyConfigured("Vector search requires the 'numpy' package")
+    if not len(ids):
+        return []
+    ids = np.asarray(ids, dtype=np.int64)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    query = np.asarray(query, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1)
+    scores = (vectors @ query) / (np.where(norms == 0, 1, norms) * (np.linalg.norm(query) or 1))
+    if len(scores) > k:
+        top = np.argpartition(-scores, k)[:k]
+        ids, scores = ids[top], scores[top]
+    order = np.argsort(-scores)
+    return [(int(ids[i]), float(scores[i])) for i in order]
+
+
+class VectorIndex:
+    """Cosine-similarity index over vectors tagged with an id and a group
+
+    Groups restrict a search, e.g. to the messages of one conversation.
+    """
+
+    def __init__(self, directory, dimensions=None):
+        if np is None:
+            raise ImproperlyConfigured("VectorIndex requires the 'numpy' package")
+        self.directory = Path(directory)
+        self.records_path = self.directory / "records.bin"
+        self.meta_path = self.directory / "meta.json"
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._records = None
+        self._load_meta()
+
+    def _load_meta(self):
+        """Read the dimensions of an existing index, possibly created by another process"""
+        if self.meta_path.exists():
+            stored = json.loads(self.meta_path.read_text())["dimensions"]
+            if self.dimensions and self.dimensions != stored:
+                raise ImproperlyConfigured(
+                    f"Index at {self.directory} holds {stored}-dimensional vectors, "
+                    f"not {self.dimensions}"
+                )
+            self.dimensions = stored
+
+    @property
+    def dtype(self):
+        return np.dtype([("id", "<i8"), ("group", "<i8"), ("vector", "<f4", (self.dimensions,))])
+
+    def __len__(self):
+        if self.dimensions is None:
+            self._load_meta()
+        if self.dimensions is None or not self.records_path.exists():
+            return 0
+        return self.records_path.stat().st_size // self.dtype.itemsize
+
+    def add(self, ids, groups, vectors):
+        """Append vectors; ids and groups are sequences of ints"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis]
+        with self._lock:
+            if self.dimensions is None:
+                self._load_meta()
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(
+                    f"Expected {self.dimensions}-dimensional vectors, got {vectors.shape[1]}"
+                )
+            if not self.meta_path.exists():
+                self.directory.mkdir(parents=True, exist_ok=True)
+                self.meta_path.write_text(json.dumps({"dimensions": self.dimensions}))
+
+            records = np.empty(len(vectors), dtype=self.dtype)
+            records["id"] = ids
+            records["group"] = groups
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            records["vector"] = vectors / np.where(norms == 0, 1, norms)
+            # O_APPEND keeps concurrent writers from interleaving partial records
+            fd = os.open(self.records_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, records.tobytes())
+            finally:
+                os.close(fd)
+
+    def records(self):
+        """Memory-map the records, remapping when the file has grown"""
+        count = len(self)
+        if self._records is None or len(self._records) != count:
+            if count == 0:
+                return None
+            self._records = np.memmap(self.records_path, dtype=self.dtype, mode="r", shape=(count,))
+        return self._records
+
+    def search(self, query, k=5, group=None, exclude_ids=()):
+        """Get the k most similar (id, score) pairs, best first
+
+        Filtering by group still reads the whole file.
+        """
+        records = self.records()
+        if records is None or not len(records):
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1)
+        exclude = np.asarray(list(exclude_ids), dtype=np.int64)
+
+        best_ids = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        for start in range(0, len(records), SEARCH_BLOCK_SIZE):
+            block = records[start:start + SEARCH_BLOCK_SIZE]
+            vectors, ids = block["vector"], block["id"]
+            if group is not None or len(exclude):
+                mask = np.ones(len(block), dtype=bool)
+                if group is not None:
+                    mask &= block["group"] == group
+                if len(exclude):
+                    mask &= ~np.isin(ids, exclude)
+                if not mask.any():
+                    continue
+                vectors, ids = vectors[mask], ids[mask]
+            scores = vectors @ query
+            if len(scores) > k:
+                top = np.argpartition(-scores, k)[:k]
+                scores, ids = scores[top], ids[top]
+            best_ids = np.concatenate([best_ids, ids])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                top = np.argpartition(-best_scores, k)[:k]
+                best_ids, best_scores = best_ids[top], best_scores[top]
+
+        order = np.argsort(-best_scores)
+        return [(int(best_ids[i]), float(best_scores[i])) for i in order]
+
+    def clear(self):
+        """Delete the index files"""
+        with self._lock:
+            self._records = None
+            for path in (self.records_path, self.meta_path):
+                if path.exists():
+                    path.unlink()
+            self.dimensions = None
+
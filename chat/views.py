@@ -1,17 +1,19 @@
-import markdown
-from django.shortcuts import redirect, get_object_or_404
-from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.http import HttpResponse, Http404
 from django.views.generic import ListView, DetailView
 from django.views.generic.edit import FormMixin
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.template.defaultfilters import linebreaksbr
+from django.template.loader import render_to_string
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 
-from .models import Conversation, Message
+from .models import Conversation
 from .forms import ConversationStartForm, MessageForm
-from .services import ConversationService
+from .services import ConversationService, format_timestamp
+from .retention import rehydrate_conversation
+from .rendering import render_markdown
 from .constants import (
     RECENT_CONVERSATIONS_LIMIT,
     ERROR_MESSAGES,
@@ -20,18 +22,6 @@ from .constants import (
 )
 
 
-def render_markdown(content):
-    """Convert markdown to HTML safely"""
-    md = markdown.Markdown(
-        extensions=[
-            "fenced_code",
-            "tables",
-            "nl2br",
-        ]
-    )
-    return mark_safe(md.convert(escape(content)))
-
-
 @method_decorator(csrf_exempt, name="dispatch")
 class HomepageView(ListView):
     """Claude.ai-style homepage showing recent conversations"""
@@ -48,19 +38,8 @@ class HomepageView(ListView):
         if not message_content:
             return HttpResponse("Message cannot be empty", status=400)
 
-        # Create new conversation
-        conversation = Conversation.objects.create(
-            title=(
-                message_content[:50] + "..."
-                if len(message_content) > 50
-                else message_content
-            )
-        )
-
-        # Save the initial message
-        Message.objects.create(
-            conversation=conversation, content=message_content, is_user=True
-        )
+        # Create new conversation with the initial message
+        conversation = ConversationService.create_conversation(message_content)
 
         # Redirect to the new chat where streaming will occur
         return redirect("chat", conversation_id=conversation.id)
@@ -75,6 +54,16 @@ class ChatView(DetailView):
     template_name = "chat.html"
     context_object_name = "conversation"
     pk_url_kwarg = "conversation_id"
+
+    def get_object(self, queryset=None):
+        """Get the conversation, restoring it from the archive if needed"""
+        try:
+            return super().get_object(queryset)
+        except Http404:
+            conversation = rehydrate_conversation(self.kwargs[self.pk_url_kwarg])
+            if conversation is None:
+                raise
+            return conversation
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -86,6 +75,9 @@ class ChatView(DetailView):
             if message.is_user:
                 # User messages: simple line breaks
                 formatted_content = linebreaksbr(escape(message.content))
+            elif message.rendered_html:
+                # AI messages: markdown pre-rendered by the post-turn pipeline
+                formatted_content = mark_safe(message.rendered_html)
             else:
                 # AI messages: render markdown
                 formatted_content = render_markdown(message.content)
@@ -107,7 +99,7 @@ class ChatView(DetailView):
         if not message_content:
             return HttpResponse(ERROR_MESSAGES["EMPTY_MESSAGE"], status=400)
 
-        conversation = get_object_or_404(Conversation, id=conversation_id)
+        conversation = self.get_object()
 
         # Save user message using service
         user_message = ConversationService.add_user_message(
@@ -117,76 +109,21 @@ class ChatView(DetailView):
         # Format user content
         user_formatted = linebreaksbr(escape(user_message.content))
 
-        # Return user message HTML and placeholder for AI response with SSE
+        # Return user message HTML and a placeholder that static/js/chat.js streams into
+        placeholder = render_to_string(
+            "partials/ai_placeholder.html",
+            {"conversation": conversation, "user_message": user_message},
+        )
         return HttpResponse(
             f"""
             <!-- User Message -->
             <div class="d-flex justify-content-end mb-3 fade-in">
                 <div class="message-bubble user-message rounded-3 px-3 py-2">
                     <div class="mb-1">{user_formatted}</div>
-                    <small class="opacity-75">{user_message.timestamp.astimezone().strftime('%I:%M %p').lstrip('0').replace(' 0', ' ')}</small>
-                </div>
-            </div>
-
-            <!-- AI Message Placeholder -->
-            <div class="d-flex justify-content-start mb-3 fade-in" id="ai-response-{user_message.id}">
-                <div class="me-2">
-                    <div class="ai-avatar rounded-circle d-flex align-items-center justify-content-center fw-bold">
-                        G3
-                    </div>
-                </div>
-                <div class="message-bubble ai-message rounded-3 px-3 py-2">
-                    <div class="mb-1 text-break markdown-content" id="ai-content-{user_message.id}"></div>
-                    <small class="text-muted" id="ai-timestamp-{user_message.id}"></small>
+                    <small class="opacity-75">{format_timestamp(user_message.timestamp)}</small>
                 </div>
             </div>
 
-            <!-- SSE Script for Streaming -->
-            <script>
-                const eventSource = new EventSource('/chat/{conversation.id}/stream/?message_id={user_message.id}');
-                let aiContent = '';
-                const contentDiv = document.getElementById('ai-content-{user_message.id}');
-                const timestampDiv = document.getElementById('ai-timestamp-{user_message.id}');
-                
-                eventSource.onmessage = function(event) {{
-                    const data = JSON.parse(event.data);
-                    
-                    if (data.type === 'token') {{
-                        aiContent += data.content;
-                        contentDiv.textContent = aiContent;
-                    }} else if (data.type === 'done') {{
-                        timestampDiv.innerHTML = data.timestamp + ' • Gemma 3 4B';
-                        eventSource.close();
-                        // Convert markdown to HTML
-                        const csrfToken = document.querySelector('[name=csrfmiddlewaretoken]');
-                        if (csrfToken) {{
-                            fetch('/chat/{conversation.id}/render-markdown/', {{
-                                method: 'POST',
-                                headers: {{
-                                    'Content-Type': 'application/json',
-                                    'X-CSRFToken': csrfToken.value
-                                }},
-                                body: JSON.stringify({{content: aiContent}})
-                            }})
-                            .then(response => response.text())
-                            .then(html => {{
-                                contentDiv.innerHTML = html;
-                                hljs.highlightAll();
-                            }});
-                        }} else {{
-                            // Fallback if no CSRF token - just display raw content
-                            contentDiv.innerHTML = aiContent;
-                        }}
-                    }}
-                }};
-                
-                eventSource.onerror = function(event) {{
-                    console.error('SSE error:', event);
-                    console.error('ReadyState:', eventSource.readyState);
-                    eventSource.close();
-                    contentDiv.innerHTML = '<em>Error: Connection lost. Check console for details.</em>';
-                }};
-            </script>
+            {placeholder}
         """
         )
-
@@ -1,5 +1,10 @@
-import httpx
+import asyncio
 import json
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
 from django.shortcuts import get_object_or_404
 from django.http import HttpResponse, StreamingHttpResponse, JsonResponse
 from django.views.generic import View
@@ -8,9 +13,12 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 from .models import Conversation, Message
-from .views import render_markdown
-from .services import ConversationService
-from .constants import ERROR_MESSAGES, OLLAMA_CHAT_ENDPOINT, OLLAMA_MODEL
+from .rendering import render_markdown
+from .services import GenerationService, PrefetchService
+from .pubsub import channel_for_message, get_token_bus
+from .profiling import span
+from .batch import BatchRunner, parse_prompt
+from .constants import ERROR_MESSAGES, BATCH_CONCURRENCY, BATCH_MAX_PROMPTS
 
 
 @method_decorator(csrf_exempt, name="dispatch")
@@ -32,66 +40,91 @@ class StreamChatView(SingleObjectMixin, View):
             Message, id=message_id, conversation=conversation, is_user=True
         )
 
-        # Build conversation context
-        messages = list(conversation.messages.all().order_by("timestamp"))
-        ollama_messages = []
-        for msg in messages[-10:]:
-            role = "user" if msg.is_user else "assistant"
-            ollama_messages.append({"role": role, "content": msg.content})
+        with span("stream.start"):
+            channel = GenerationService.start(
+                conversation,
+                user_message,
+                client_identities=getattr(request, "rate_limit_identities", ()),
+            )
+        bus = get_token_bus()
 
+        # The finally blocks run when the client disconnects: on WSGI the
+        # server closes the generator (GeneratorExit); on ASGI Django cancels
+        # the response on http.disconnect, so an async iterator is used there.
         def generate():
-            """Generator function for SSE streaming"""
-            full_response = ""
-            
+            """Relay the generation's token channel as Server-Sent Events"""
+            GenerationService.add_subscriber(channel)
+            try:
+                for event in bus.subscribe(channel):
+                    yield f"data: {json.dumps(event)}\n\n"
+            finally:
+                GenerationService.remove_subscriber(channel)
+
+        async def agenerate():
+            """Async variant of generate() for ASGI servers"""
+            await sync_to_async(GenerationService.add_subscriber)(channel)
+            # The subscription is iterated in one thread of its own, so a bus
+            # polling the database uses a single connection, closed at the end
+            loop = asyncio.get_running_loop()
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stream")
+            events = bus.subscribe(channel)
+
+            def release():
+                events.close()
+                connection.close()
+
             try:
-                # Use synchronous httpx client with stream
-                with httpx.Client(timeout=60.0) as client:
-                    with client.stream(
-                        "POST",
-                        OLLAMA_CHAT_ENDPOINT,
-                        json={
-                            "model": OLLAMA_MODEL,
-                            "messages": ollama_messages,
-                            "stream": True,
-                        },
-                    ) as response:
-                        for line in response.iter_lines():
-                            if line:
-                                try:
-                                    data = json.loads(line)
-                                    if "message" in data and "content" in data["message"]:
-                                        token = data["message"]["content"]
-                                        full_response += token
-                                        yield f"data: {json.dumps({'type': 'token', 'content': token})}\n\n"
-                                except json.JSONDecodeError:
-                                    continue
-                                except Exception as e:
-                                    yield f"data: {json.dumps({'type': 'error', 'content': f'Parse error: {str(e)}'})}\n\n"
-            except Exception as e:
-                yield f"data: {json.dumps({'type': 'error', 'content': f'Connection error: {str(e)}'})}\n\n"
-                return
-
-            # Save the complete message if we got a response
-            if full_response:
-                ai_message = ConversationService.add_ai_message(
-                    conversation, full_response
-                )
-                # Send completion signal
-                # Convert to local timezone and format to match Django templates (g:i A format)
-                local_time = ai_message.timestamp.astimezone()
-                timestamp_str = local_time.strftime('%I:%M %p').lstrip('0').replace(' 0', ' ')
-                yield f"data: {json.dumps({'type': 'done', 'timestamp': timestamp_str})}\n\n"
-            else:
-                yield f"data: {json.dumps({'type': 'error', 'content': ERROR_MESSAGES['NO_RESPONSE']})}\n\n"
+                while (event := await loop.run_in_executor(executor, next, events, None)) is not None:
+                    yield f"data: {json.dumps(event)}\n\n"
+            finally:
+                # Not awaited: on disconnect, a poll may still be running in the thread
+                executor.submit(release)
+                executor.shutdown(wait=False)
+                await sync_to_async(GenerationService.remove_subscriber)(channel)
 
         response = StreamingHttpResponse(
-            generate(), content_type="text/event-stream"
+            agenerate() if isinstance(request, ASGIRequest) else generate(),
+            content_type="text/event-stream",
         )
         response["Cache-Control"] = "no-cache"
         response["X-Accel-Buffering"] = "no"
         return response
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class StopGenerationView(SingleObjectMixin, View):
+    """API endpoint to stop the response being generated for a message"""
+
+    model = Conversation
+    pk_url_kwarg = "conversation_id"
+
+    def post(self, request, *args, **kwargs):
+        """Cancel the generation; the stream ends with the partial response"""
+        message_id = request.POST.get("message_id") or request.GET.get("message_id")
+        if not message_id:
+            return HttpResponse("Missing message_id", status=400)
+
+        conversation = self.get_object()
+        user_message = get_object_or_404(
+            Message, id=message_id, conversation=conversation, is_user=True
+        )
+        GenerationService.cancel(channel_for_message(user_message.id))
+        return JsonResponse({"stopped": True})
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class PrefetchView(SingleObjectMixin, View):
+    """API endpoint the chat input calls while typing to warm the model's cache"""
+
+    model = Conversation
+    pk_url_kwarg = "conversation_id"
+
+    def post(self, request, *args, **kwargs):
+        """Start evaluating the conversation history, unless throttled or already warm"""
+        started = PrefetchService.prefetch(self.get_object())
+        return JsonResponse({"prefetching": started}, status=202 if started else 200)
+
+
 @method_decorator(csrf_exempt, name="dispatch") 
 class RenderMarkdownView(View):
     """API endpoint to render markdown to HTML"""
@@ -106,4 +139,40 @@ class RenderMarkdownView(View):
         except json.JSONDecodeError:
             return JsonResponse({"error": ERROR_MESSAGES["INVALID_JSON"]}, status=400)
         except Exception as e:
-            return JsonResponse({"error": str(e)}, status=500)
\ No newline at end of file
+            return JsonResponse({"error": str(e)}, status=500)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class BatchCompleteView(View):
+    """API endpoint to run a batch of prompts through the model"""
+
+    def post(self, request):
+        """Complete each prompt and return the results, in completion order, with a throughput report
+
+        Generated tokens are charged to the client's token quota; once it is
+        overdrawn, the remaining prompts fail as rate limited.
+        """
+        try:
+            data = json.loads(request.body)
+        except json.JSONDecodeError:
+            return JsonResponse({"error": ERROR_MESSAGES["INVALID_JSON"]}, status=400)
+
+        prompts = data.get("prompts") if isinstance(data, dict) else None
+        if not isinstance(prompts, list) or not prompts:
+            return JsonResponse({"error": ERROR_MESSAGES["INVALID_BATCH"]}, status=400)
+        if len(prompts) > BATCH_MAX_PROMPTS:
+            return JsonResponse({"error": ERROR_MESSAGES["BATCH_TOO_LARGE"]}, status=400)
+        try:
+            prompts = [parse_prompt(item, index) for index, item in enumerate(prompts)]
+            concurrency = int(data.get("concurrency", BATCH_CONCURRENCY))
+        except (TypeError, ValueError) as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        runner = BatchRunner(
+            concurrency=max(1, min(concurrency, BATCH_CONCURRENCY)),
+            persist=bool(data.get("persist", False)),
+            client_identities=getattr(request, "rate_limit_identities", ()),
+        )
+        results = []
+        report = async_to_sync(runner.run)(prompts, on_result=results.append)
+        return JsonResponse({"results": results, "report": report.as_dict()})
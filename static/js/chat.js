@@ -0,0 +1,97 @@
+// Chat page behaviour: streaming responses over SSE, stopping them,
+// and prefetching the conversation while the user types.
+(function() {
+    const chatMessages = document.getElementById('chat-messages');
+
+    function scrollToBottom() {
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+    }
+
+    function csrfToken() {
+        const input = document.querySelector('[name=csrfmiddlewaretoken]');
+        return input ? input.value : '';
+    }
+
+    // Stream the response into a placeholder rendered from partials/ai_placeholder.html
+    function streamResponse(placeholder) {
+        placeholder.dataset.streaming = 'true';
+        const contentDiv = placeholder.querySelector('[data-role=content]');
+        const timestampDiv = placeholder.querySelector('[data-role=timestamp]');
+        const stopButton = placeholder.querySelector('[data-role=stop]');
+        const eventSource = new EventSource(placeholder.dataset.streamUrl);
+        let aiContent = '';
+
+        stopButton.onclick = function() {
+            stopButton.disabled = true;
+            fetch(placeholder.dataset.stopUrl, {method: 'POST'});
+        };
+
+        eventSource.onmessage = function(event) {
+            const data = JSON.parse(event.data);
+
+            if (data.type === 'token') {
+                aiContent += data.content;
+                contentDiv.textContent = aiContent;
+                scrollToBottom();
+            } else if (data.type === 'done') {
+                timestampDiv.innerHTML = data.timestamp + ' • Gemma 3 4B' + (data.truncated ? ' • Stopped' : '');
+                stopButton.remove();
+                eventSource.close();
+                // Convert markdown to HTML
+                fetch(placeholder.dataset.renderUrl, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'X-CSRFToken': csrfToken()
+                    },
+                    body: JSON.stringify({content: aiContent})
+                })
+                .then(response => response.text())
+                .then(html => {
+                    contentDiv.innerHTML = html;
+                    hljs.highlightAll();
+                    scrollToBottom();
+                });
+            } else if (data.type === 'error') {
+                eventSource.close();
+                stopButton.remove();
+                contentDiv.innerHTML = '<em></em>';
+                contentDiv.firstChild.textContent = data.content;
+            }
+        };
+
+        eventSource.onerror = function(event) {
+            console.error('SSE error:', event);
+            eventSource.close();
+            stopButton.remove();
+            contentDiv.innerHTML = '<em>Error: Connection lost</em>';
+        };
+    }
+
+    function startStreams(root) {
+        root.querySelectorAll('[data-stream-url]:not([data-streaming])').forEach(streamResponse);
+    }
+
+    // Warm the model's cache with this conversation once the user starts typing
+    const messageInput = document.querySelector('input[name=message]');
+    let prefetched = false;
+    messageInput.addEventListener('input', function() {
+        if (!prefetched && messageInput.value.trim()) {
+            prefetched = true;
+            fetch(messageInput.form.dataset.prefetchUrl, {method: 'POST'});
+        }
+    });
+    messageInput.form.addEventListener('htmx:afterRequest', function() {
+        prefetched = false;
+    });
+
+    document.body.addEventListener('htmx:afterSwap', function() {
+        hljs.highlightAll();
+        startStreams(chatMessages);
+    });
+
+    hljs.highlightAll();
+    scrollToBottom();
+    // A conversation started from the homepage renders its first placeholder
+    startStreams(chatMessages);
+})();